@@ -0,0 +1,51 @@
+"""Compares the default and the write-only modes of CustomFile.create_excel_file_from_csv.
+
+Usage:
+    python benchmarks/excel_export.py [rows] [columns]
+"""
+import csv
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pytoolbase.file_manipulation import CustomFile
+
+
+def write_synthetic_csv(csv_file_path, rows, columns):
+    with open(csv_file_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow([f'column_{column}' for column in range(columns)])
+        for row in range(rows):
+            writer.writerow([f'{row}-{column}' for column in range(columns)])
+
+
+def measure(custom_file, folder, rows, columns, write_only):
+    csv_file_path = os.path.join(folder, f'export_{write_only}.csv')
+    excel_file_path = os.path.join(folder, f'export_{write_only}.xlsx')
+    write_synthetic_csv(csv_file_path, rows, columns)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    custom_file.create_excel_file_from_csv(csv_file_path, excel_file_path, 'utf-8', write_only=write_only)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return elapsed, peak
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    columns = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    custom_file = CustomFile()
+
+    with tempfile.TemporaryDirectory() as folder:
+        for write_only in (False, True):
+            elapsed, peak = measure(custom_file, folder, rows, columns, write_only)
+            print(f'write_only={write_only}: {rows} rows x {columns} columns in {elapsed:.2f} s, '
+                  f'peak memory {peak / 1024 / 1024:.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Compares the full formulas model path of CustomFile.save_calculated_cell_value
+with the cached, incremental CustomFile.recalculate_cells.
+
+Usage:
+    python benchmarks/excel_recalculation.py [formula_rows] [iterations]
+"""
+import os
+import sys
+import tempfile
+import time
+import formulas
+from openpyxl.workbook import Workbook
+from pytoolbase.file_manipulation import CustomFile
+
+
+def write_synthetic_template(excel_file_path, formula_rows):
+    """A template with one input cell (B1) driving a chain of formulas and a total (D1),
+    plus independent formulas that an incremental recalculation can skip"""
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'Sheet1'
+    ws['A1'] = 'input'
+    ws['B1'] = 1
+    ws['C1'] = 'total'
+    ws['D1'] = f'=SUM(B2:B{formula_rows + 1})'
+
+    for row in range(2, formula_rows + 2):
+        ws[f'A{row}'] = row
+        ws[f'B{row}'] = f'=A{row}*$B$1'
+        ws[f'C{row}'] = f'=A{row}*2+1'
+
+    wb.save(excel_file_path)
+
+
+def main():
+    formula_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    custom_file = CustomFile()
+
+    with tempfile.TemporaryDirectory() as folder:
+        template_path = os.path.join(folder, 'template.xlsx')
+        write_synthetic_template(template_path, formula_rows)
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            # Same steps of save_calculated_cell_value before the model was cached
+            xl_model = formulas.ExcelModel().loads(template_path).finish()
+            xl_model.calculate()
+            xl_model.write(dirpath=folder)
+        full_seconds = (time.perf_counter() - start) / iterations
+
+        target_path = os.path.join(folder, 'target.xlsx')
+        start = time.perf_counter()
+        for value in range(iterations):
+            # The lowercase file name checks that the references keep the case of the book
+            total = custom_file.recalculate_cells(template_path, {'Sheet1!B1': value}, ['Sheet1!D1'], target_path)
+            if total['Sheet1!D1'] != value * sum(range(2, formula_rows + 2)):
+                raise ValueError(f'Wrong total {total} for input {value}')
+        incremental_seconds = (time.perf_counter() - start) / iterations
+
+    print(f'{formula_rows} formula rows, {iterations} iterations')
+    print(f'full model:  {full_seconds:.3f} s per call')
+    print(f'incremental: {incremental_seconds:.3f} s per call (first call includes model build and compile)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Measures the cost of the log calls of the package with the debug level disabled and enabled,
+comparing eager f-string messages with the lazy, summarized arguments of CustomLogger.
+
+Usage:
+    python benchmarks/logging_overhead.py [rows] [calls]
+"""
+import logging
+import sys
+import time
+import numpy as np
+import pandas as pd
+from pytoolbase.my_logger import CustomLogger, configure_log_levels
+
+
+def time_calls(calls, log_call):
+    start = time.perf_counter()
+    for _ in range(calls):
+        log_call()
+    return (time.perf_counter() - start) / calls * 1_000_000
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    calls = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    logger = CustomLogger('LoggingOverheadBenchmark').custom_logger(logging.DEBUG)
+    pandas_dataframe = pd.DataFrame({
+        'id': np.arange(rows),
+        'value': np.random.default_rng(0).random(rows),
+        'label': [f'label {i % 1000}' for i in range(rows)]
+    })
+    sql = 'SELECT ' + ', '.join(f'COLUMN_{i}' for i in range(2000)) + ' FROM TABLE'
+
+    cases = {
+        'dataframe': (
+            lambda: logger.debug(f'Dataframe {pandas_dataframe}.'),
+            lambda: logger.debug('Dataframe %s.', pandas_dataframe)
+        ),
+        'sql text': (
+            lambda: logger.debug(f'Query: {sql}'),
+            lambda: logger.debug('Query: %s', sql)
+        ),
+        'parameters': (
+            lambda: logger.debug(f'Parameters {rows}, {calls}, {sql[:20]}'),
+            lambda: logger.debug('Parameters %s, %s, %s', rows, calls, sql[:20])
+        )
+    }
+
+    print(f'{rows} rows dataframe, {calls} calls per case, microseconds per call')
+    print(f'{"case":<12}{"level":<8}{"f-string":>14}{"lazy":>14}')
+    for level_name in ('WARNING', 'DEBUG'):
+        configure_log_levels(levels={'LOGGINGOVERHEADBENCHMARK': level_name})
+        for name, (eager_call, lazy_call) in cases.items():
+            eager = time_calls(calls, eager_call)
+            lazy = time_calls(calls, lazy_call)
+            print(f'{name:<12}{level_name.lower():<8}{eager:>14.1f}{lazy:>14.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,344 @@
+"""Benchmark suite of the hot paths of the package, run on synthetic data at several sizes.
+
+An in-memory SQLite database stands in for the JDBC connection and a local HTTP server
+stands in for the webhooks, so the suite runs anywhere. Results are written as JSON
+(one file per run) so that runs can be compared over time with --compare.
+
+Cases whose cost makes the larger sizes impractical have a default row limit and are
+skipped above it, unless --full is given.
+
+Usage:
+    python benchmarks/suite.py [--sizes 10000,100000,1000000] [--cases csv_export,epc_round_trip]
+                               [--repeat 3] [--output benchmarks/results] [--compare previous.json] [--full]
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pandas as pd
+from excel_export import write_synthetic_csv
+from pytoolbase.database_connection import Queries
+from pytoolbase.elaborations import DataframeManipulations
+from pytoolbase.file_manipulation import CustomFile
+from pytoolbase.path_manipulation import PathManipulation
+from pytoolbase.rfid import EpcConverter
+from pytoolbase.webhooks import GoogleWebhook, MicrosoftTeamsWebhook
+
+
+class RecapConfiguration:
+    """Stand-in of the configuration class expected by DataframeManipulations"""
+
+    def get_log_level_from_log_key(self, key):
+        return logging.WARNING
+
+    def load_env_file(self):
+        return {
+            'teams_message_title': 'Benchmark recap',
+            'teams_message_footer': 'Files available at',
+            'partial_text_not_grouped': '<table><tr><th>store</th><th>item</th><th>assoluto</th></tr><tr>',
+            'non_grouped_headers': 'store,item,assoluto',
+            'partial_text_grouped': '<table><tr><th>store</th><th>assoluto</th></tr><tr>',
+            'grouped_headers': 'store,assoluto'
+        }
+
+
+class WebhookStub(BaseHTTPRequestHandler):
+    """Accepts every POST like the Google and Teams webhooks do"""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class BenchmarkContext:
+    """Synthetic data, stand-ins and instances shared by the cases"""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.custom_file = CustomFile()
+        self.path_manipulation = PathManipulation(folder, folder, folder)
+        self.queries = Queries(self.path_manipulation)
+        self.dataframe_manipulations = DataframeManipulations(RecapConfiguration(), self.custom_file)
+        self.epc_converter = EpcConverter()
+        self.__dataframes = {}
+        self.__connections = {}
+        self.__excel_files = {}
+
+        with open(os.path.join(folder, 'benchmark_select.sql'), 'w') as f:
+            f.write('SELECT id, store, item, assoluto, price, label, updated FROM sales')
+        with open(os.path.join(folder, 'benchmark_parameter_sets.sql'), 'w') as f:
+            f.write('SELECT id, store, item, assoluto FROM sales WHERE {parameter_filter}')
+
+        self.webhook_server = ThreadingHTTPServer(('127.0.0.1', 0), WebhookStub)
+        threading.Thread(target=self.webhook_server.serve_forever, daemon=True).start()
+        self.webhook_url = f'http://127.0.0.1:{self.webhook_server.server_address[1]}/webhook'
+
+    def dataframe(self, rows):
+        if rows not in self.__dataframes:
+            generator = np.random.default_rng(rows)
+            self.__dataframes[rows] = pd.DataFrame({
+                'id': np.arange(rows),
+                'store': generator.integers(0, 200, rows).astype(str),
+                'item': np.char.add('ITEM', generator.integers(0, 50000, rows).astype(str)),
+                'assoluto': generator.integers(-50, 50, rows),
+                'price': generator.random(rows).round(2) * 100,
+                'label': [f'label {i % 1000}' for i in range(rows)],
+                'updated': pd.Timestamp('2024-01-01') + pd.to_timedelta(np.arange(rows), unit='s')
+            })
+
+        return self.__dataframes[rows]
+
+    def connection(self, rows):
+        if rows not in self.__connections:
+            connection = sqlite3.connect(':memory:', check_same_thread=False)
+            self.dataframe(rows).astype({'updated': str}).to_sql('sales', connection, index=False)
+            self.__connections[rows] = connection
+
+        return self.__connections[rows]
+
+    def excel_file(self, rows):
+        if rows not in self.__excel_files:
+            excel_file_path = os.path.join(self.folder, f'columns_{rows}.xlsx')
+            # get_column_values_for_each_row reads text cells, like the parameter files it is used for
+            self.custom_file.create_excel_file_from_pandas_dataframe(self.dataframe(rows).astype(str), excel_file_path)
+            self.__excel_files[rows] = excel_file_path
+
+        return self.__excel_files[rows]
+
+    def close(self):
+        self.webhook_server.shutdown()
+        for connection in self.__connections.values():
+            connection.close()
+
+
+def gtin13(base):
+    """Appends the check digit to a 12 digits GTIN base"""
+    total = sum(int(digit) * (3 if index % 2 else 1) for index, digit in enumerate(base))
+    return base + str((10 - total % 10) % 10)
+
+
+# Each case receives the context and the number of rows, prepares its input (not timed)
+# and returns the callable to time
+
+def case_csv_export(context, rows):
+    pandas_dataframe = context.dataframe(rows)
+    csv_file_path = os.path.join(context.folder, 'export.csv')
+    return lambda: context.custom_file.create_csv_file_from_pandas_dataframe(pandas_dataframe, csv_file_path)
+
+
+def case_excel_from_csv(context, rows, write_only=False):
+    csv_file_path = os.path.join(context.folder, 'excel_source.csv')
+    excel_file_path = os.path.join(context.folder, 'excel_from_csv.xlsx')
+    write_synthetic_csv(csv_file_path, rows, 10)
+    return lambda: context.custom_file.create_excel_file_from_csv(
+        csv_file_path, excel_file_path, 'utf-8', write_only=write_only
+    )
+
+
+def case_excel_from_csv_write_only(context, rows):
+    return case_excel_from_csv(context, rows, write_only=True)
+
+
+def case_column_values(context, rows, read_only=False):
+    excel_file_path = context.excel_file(rows)
+    return lambda: context.custom_file.get_column_values_for_each_row(excel_file_path, [1, 3, 4], read_only)
+
+
+def case_column_values_read_only(context, rows):
+    return case_column_values(context, rows, read_only=True)
+
+
+def case_text_to_send(context, rows):
+    not_grouped = context.dataframe(rows)[['store', 'item', 'assoluto']]
+    grouped = not_grouped.groupby('store', as_index=False)['assoluto'].sum()
+    return lambda: context.dataframe_manipulations.create_text_to_send(not_grouped, grouped, r'\\share\reports')
+
+
+def case_text_to_send_truncated(context, rows):
+    not_grouped = context.dataframe(rows)[['store', 'item', 'assoluto']]
+    grouped = not_grouped.groupby('store', as_index=False)['assoluto'].sum()
+    return lambda: context.dataframe_manipulations.create_text_to_send(
+        not_grouped, grouped, r'\\share\reports', max_rows=100
+    )
+
+
+def case_epc_round_trip(context, rows):
+    matricole = [gtin13(f'80327591{i % 10000:04d}') + f'{i % 100000:05d}' + f'{i % 10000000:07d}' for i in range(rows)]
+
+    def run():
+        for matricola in matricole:
+            if context.epc_converter.epc_to_matricola(context.epc_converter.matricola_to_epc(matricola)) != matricola:
+                raise ValueError(f'Round trip failed for {matricola}')
+
+    return run
+
+
+def case_query_pandas(context, rows):
+    connection = context.connection(rows)
+    return lambda: context.queries.get_pandas_df_from_query('benchmark_select.sql', connection, None)
+
+
+def case_query_chunks(context, rows):
+    connection = context.connection(rows)
+    return lambda: sum(
+        len(chunk) for chunk in context.queries.iter_query_chunks('benchmark_select.sql', connection, None)
+    )
+
+
+def case_query_columnar(context, rows):
+    connection = context.connection(rows)
+    return lambda: context.queries.get_columnar_from_query(
+        'benchmark_select.sql', connection, None, output_format='numpy'
+    )
+
+
+def case_query_parameter_sets(context, rows):
+    connection = context.connection(rows)
+    parameter_sets = {row: [row * 7 % rows] for row in range(min(rows, 5000))}
+    return lambda: context.queries.get_pandas_df_for_parameter_sets(
+        'benchmark_parameter_sets.sql', connection, parameter_sets, ['id']
+    )
+
+
+def case_webhooks(context, rows):
+    not_grouped = context.dataframe(rows)[['store', 'item', 'assoluto']]
+    grouped = not_grouped.groupby('store', as_index=False)['assoluto'].sum()
+    message = context.dataframe_manipulations.create_text_to_send(not_grouped, grouped, r'\\share\reports')
+
+    def run():
+        GoogleWebhook(context.webhook_url).send_message_to_google_space(message)
+        MicrosoftTeamsWebhook(context.webhook_url).send_message_to_teams_chat(message)
+
+    return run
+
+
+# name -> (case, default row limit or None)
+CASES = {
+    'csv_export': (case_csv_export, None),
+    'excel_from_csv': (case_excel_from_csv, 100_000),
+    'excel_from_csv_write_only': (case_excel_from_csv_write_only, 100_000),
+    'column_values': (case_column_values, 100_000),
+    'column_values_read_only': (case_column_values_read_only, 100_000),
+    'text_to_send': (case_text_to_send, None),
+    'text_to_send_truncated': (case_text_to_send_truncated, None),
+    'epc_round_trip': (case_epc_round_trip, 100_000),
+    'query_pandas': (case_query_pandas, None),
+    'query_chunks': (case_query_chunks, None),
+    'query_columnar': (case_query_columnar, None),
+    'query_parameter_sets': (case_query_parameter_sets, None),
+    'webhooks': (case_webhooks, 100_000)
+}
+
+
+def run_suite(sizes, case_names, repeat, full):
+    results = []
+
+    with tempfile.TemporaryDirectory() as folder:
+        context = BenchmarkContext(folder)
+        try:
+            for rows in sizes:
+                for name in case_names:
+                    case, row_limit = CASES[name]
+                    if not full and row_limit is not None and rows > row_limit:
+                        print(f'{name:<28}{rows:>10}  skipped (above {row_limit} rows, use --full)')
+                        continue
+
+                    timings = []
+                    for _ in range(repeat):
+                        run = case(context, rows)
+                        start = time.perf_counter()
+                        run()
+                        timings.append(time.perf_counter() - start)
+
+                    seconds = min(timings)
+                    results.append({
+                        'case': name,
+                        'rows': rows,
+                        'seconds': seconds,
+                        'timings': timings,
+                        'rows_per_second': rows / seconds if seconds > 0 else None
+                    })
+                    print(f'{name:<28}{rows:>10}{seconds:>12.3f} s')
+        finally:
+            context.close()
+
+    return results
+
+
+def get_git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, previous_results_path):
+    with open(previous_results_path, encoding='utf-8') as f:
+        previous = {(result['case'], result['rows']): result['seconds'] for result in json.load(f)['results']}
+
+    print(f'\nCompared with {previous_results_path} (ratio > 1 is slower)')
+    for result in results:
+        previous_seconds = previous.get((result['case'], result['rows']))
+        if previous_seconds:
+            print(f'{result["case"]:<28}{result["rows"]:>10}{result["seconds"] / previous_seconds:>12.2f}x')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='Comma separated numbers of rows')
+    parser.add_argument('--cases', default=','.join(CASES), help='Comma separated names of the cases to run')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs of each case; the fastest one is kept')
+    parser.add_argument('--output', default=os.path.join(os.path.dirname(__file__), 'results'),
+                        help='Folder of the JSON results')
+    parser.add_argument('--compare', help='JSON results of a previous run to compare with')
+    parser.add_argument('--full', action='store_true', help='Ignore the row limits of the cases')
+    arguments = parser.parse_args()
+
+    sizes = [int(size) for size in arguments.sizes.split(',')]
+    case_names = arguments.cases.split(',')
+    unknown = [name for name in case_names if name not in CASES]
+    if unknown:
+        parser.error(f'Unknown cases {unknown}. Available: {", ".join(CASES)}')
+
+    started = datetime.datetime.now()
+    results = run_suite(sizes, case_names, arguments.repeat, arguments.full)
+
+    os.makedirs(arguments.output, exist_ok=True)
+    results_path = os.path.join(arguments.output, f'{started.strftime("%Y%m%d-%H%M%S")}.json')
+    with open(results_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'started': started.isoformat(timespec='seconds'),
+            'git_commit': get_git_commit(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'sizes': sizes,
+            'repeat': arguments.repeat,
+            'results': results
+        }, f, indent=2)
+    print(f'\nResults written to {results_path}')
+
+    if arguments.compare:
+        compare(results, arguments.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Runs a ReportPipeline job end to end against a local SQLite database, without DB2, shares
+or webhooks: a sqlite3 connection factory stands in for the pooled Database.connection and a
+local folder stands in for the remote share.
+
+Usage:
+    python examples/report_pipeline_sqlite.py [rows]
+"""
+import contextlib
+import os
+import sqlite3
+import sys
+import tempfile
+from pytoolbase.path_manipulation import PathManipulation
+from pytoolbase.pipeline import ReportPipeline
+
+
+def create_database(database_path, rows):
+    with contextlib.closing(sqlite3.connect(database_path)) as connection:
+        connection.execute('CREATE TABLE sales (store TEXT, item TEXT, country TEXT, assoluto INTEGER)')
+        connection.executemany(
+            'INSERT INTO sales VALUES (?, ?, ?, ?)',
+            [(f'store {row % 20}', f'item {row % 500}', ('it', 'fr')[row % 2], row % 97) for row in range(rows)]
+        )
+        connection.commit()
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    with tempfile.TemporaryDirectory() as folder:
+        queries_path = os.path.join(folder, 'queries')
+        remote_folder = os.path.join(folder, 'remote')
+        os.makedirs(queries_path)
+        os.makedirs(remote_folder)
+
+        database_path = os.path.join(folder, 'sales.sqlite')
+        create_database(database_path, rows)
+        with open(os.path.join(queries_path, 'sales.sql'), 'w') as f:
+            f.write('SELECT store, item, assoluto FROM sales WHERE country = ?')
+
+        # Every (environment, country) gets a new connection to the same local database
+        def connection_factory(environment, country):
+            return contextlib.closing(sqlite3.connect(database_path))
+
+        pipeline = ReportPipeline(
+            PathManipulation(folder, folder, queries_path), connection_factory=connection_factory
+        )
+        definition = {'stages': [
+            {'name': 'extract_it', 'type': 'query', 'query_file': 'sales.sql', 'environment': 'local',
+             'country': 'it', 'parameters': ['it']},
+            {'name': 'extract_fr', 'type': 'query', 'query_file': 'sales.sql', 'environment': 'local',
+             'country': 'fr', 'parameters': ['fr']},
+            {'name': 'export_it', 'type': 'export', 'depends_on': ['extract_it'],
+             'format': 'csv', 'path': os.path.join(folder, 'sales_it.csv')},
+            {'name': 'export_all', 'type': 'export', 'depends_on': ['extract_it', 'extract_fr'],
+             'format': 'xlsx', 'path': os.path.join(folder, 'sales_all.xlsx')},
+            {'name': 'publish', 'type': 'publish', 'depends_on': ['export_it', 'export_all'],
+             'remote_folder': remote_folder}
+        ]}
+
+        print(pipeline.run(definition, dry_run=True))
+        report = pipeline.run(definition)
+
+        for name, stage_report in report.items():
+            print(f'{name:<12}{stage_report["status"]:<8}{stage_report["seconds"]:>8.3f} s')
+        print(f'Published: {sorted(os.listdir(remote_folder))}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,16 @@
 from . import configuration_file
 from . import cypher
 from . import database_connection
+from . import jvm_warm_up
+from . import metrics
+from . import query_cache
+from . import query_fan_out
+from . import incremental_extraction
+from . import dataframe_optimization
+from . import csv_export
+from . import file_transfer
+from . import report_builder
+from . import pipeline
 from . import file_manipulation
 from . import my_logger
 from . import webhooks
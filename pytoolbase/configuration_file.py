@@ -24,7 +24,7 @@ class Configuration:
         Args:
             filepath(str)   Path to the .env file
         """
-        self.__custom_logger.info(f'get_value_from_env_file. Parameters: {filepath}')
+        self.__custom_logger.info('get_value_from_env_file. Parameters: %s', filepath)
 
         if os.path.exists(filepath):
             self.__custom_logger.debug(f'loading dotenv file')
@@ -35,7 +35,7 @@ class Configuration:
         return None
 
     def set_env_file_key(self, key_to_set, key_value):
-        self.__custom_logger.info(f'set_env_file_key. Parameters: {key_to_set}, {key_value}')
+        self.__custom_logger.info('set_env_file_key. Parameters: %s, %s', key_to_set, key_value)
 
         load_dotenv(self.__env_file_path)
         os.environ[key_to_set] = key_value
@@ -60,7 +60,7 @@ class Configuration:
             Exception   If the json file can't be opened or can't be found
             JSONDecodeError     If the file is not a JSON or can't be decoded as such
         """
-        self.__custom_logger.info(f'get_value_from_json. Parameters: {json_file}, {key}, {sub_key}')
+        self.__custom_logger.info('get_value_from_json. Parameters: %s, %s, %s', json_file, key, sub_key)
         try:
             with open(json_file) as jf:
                 data = json.load(jf)
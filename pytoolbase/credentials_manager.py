@@ -26,7 +26,7 @@ class CustomCredentialsManager:
         self.__token_path = self.__path_class.get_token_path()
         self.__user_cred_file_path = self.__path_class.get_user_credentials_path()
         self.__service_acc_cred_file_path = self.__path_class.get_service_account_credentials_path()
-        self.__custom_logger.info(f'Initializing CustomCredentialsManager Class. Parameter: {path_manipulation_class}')
+        self.__custom_logger.info('Initializing CustomCredentialsManager Class. Parameter: %s', path_manipulation_class)
 
     def get_user_scopes(self):
         self.__custom_logger.info(f'get_user_scopes')
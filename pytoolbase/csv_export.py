@@ -0,0 +1,203 @@
+import gzip
+import logging
+import os
+import queue
+import threading
+import pandas as pd
+from .my_logger import CustomLogger
+
+
+class StreamingCsvWriter:
+    """Writes pandas dataframe chunks to one or more csv files as they arrive.
+
+    The chunks are serialized on the calling thread while compression and disk writes
+    happen on a worker thread, so the extract can keep flowing while the previous chunk
+    is written. The output can be compressed with gzip or zstd and split in several
+    files by number of rows or size. zstd compression requires the optional zstandard package.
+
+    Attributes:
+        custom_logger   Instance of the custom logger class. Used for logging purposes
+        csv_file_path   Path of the csv file. Split files get a _partNNNN suffix
+        compression     None, 'gzip' or 'zstd'
+        max_rows_per_file   Maximum number of data rows in each file. None doesn't split by rows
+        max_bytes_per_file  Maximum uncompressed bytes in each file, checked between chunks.
+                            None doesn't split by size
+        encoding    Encoding of the csv file
+        queue   Queue of the messages sent to the worker thread
+        worker  Worker thread compressing and writing the data
+        worker_error    Exception raised by the worker thread, if any
+        files   Paths of the files written
+        file_rows   Data rows written in the current file
+        file_bytes  Uncompressed bytes written in the current file
+        rows    Data rows written in total
+    """
+    __custom_logger = None
+    __csv_file_path = None
+    __compression = None
+    __max_rows_per_file = None
+    __max_bytes_per_file = None
+    __encoding = None
+    __queue = None
+    __worker = None
+    __worker_error = None
+    __files = None
+    __file_rows = 0
+    __file_bytes = 0
+    __rows = 0
+    __extensions = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+
+    def __init__(self, csv_file_path, compression=None, max_rows_per_file=None, max_bytes_per_file=None,
+                 encoding='utf-8', queue_size=4):
+        self.__custom_logger = CustomLogger('StreamingCsvWriterClass').custom_logger(logging.DEBUG)
+        self.__custom_logger.info(
+            'Initializing StreamingCsvWriter Class. Parameters: %s, %s, %s, %s, %s',
+            csv_file_path, compression, max_rows_per_file, max_bytes_per_file, encoding
+        )
+
+        if compression not in self.__extensions:
+            raise ValueError(f'Unknown compression {compression}')
+
+        if compression == 'zstd':
+            # Fails here rather than on the worker thread when zstandard is missing
+            import zstandard
+
+        self.__csv_file_path = csv_file_path
+        self.__compression = compression
+        self.__max_rows_per_file = max_rows_per_file
+        self.__max_bytes_per_file = max_bytes_per_file
+        self.__encoding = encoding
+        self.__files = []
+        self.__queue = queue.Queue(maxsize=queue_size)
+        self.__worker = threading.Thread(target=self.__write_worker, name='pytoolbase-csv-writer', daemon=True)
+        self.__worker.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, pandas_dataframe):
+        """Appends a dataframe chunk to the output, opening a new file when a limit is reached"""
+        self.__custom_logger.debug('write. %s rows', len(pandas_dataframe))
+        start = 0
+
+        while start < len(pandas_dataframe) or not self.__files:
+            if not self.__files or self.__is_file_full():
+                self.__open_next_file(pandas_dataframe.columns)
+
+            stop = len(pandas_dataframe)
+            if self.__max_rows_per_file is not None:
+                stop = min(stop, start + self.__max_rows_per_file - self.__file_rows)
+
+            data = self.__to_csv(pandas_dataframe.iloc[start:stop], header=False)
+            self.__send(('data', data))
+            self.__file_rows += stop - start
+            self.__file_bytes += len(data)
+            self.__rows += stop - start
+            start = stop
+
+    def close(self):
+        """Flushes the data, waits for the worker thread and returns the list of files written"""
+        self.__custom_logger.info(f'close')
+
+        if self.__worker.is_alive():
+            # Not through __send: after an error the worker waits for this message before exiting
+            self.__queue.put(('close', None))
+            self.__worker.join()
+
+        if self.__worker_error is not None:
+            raise self.__worker_error
+
+        self.__custom_logger.info('Written %s rows in %s files', self.__rows, len(self.__files))
+
+        return list(self.__files)
+
+    def __is_file_full(self):
+        if self.__max_rows_per_file is not None and self.__file_rows >= self.__max_rows_per_file:
+            return True
+
+        return self.__max_bytes_per_file is not None and self.__file_bytes >= self.__max_bytes_per_file
+
+    def __open_next_file(self, columns):
+        extension = self.__extensions[self.__compression]
+        split = self.__max_rows_per_file is not None or self.__max_bytes_per_file is not None
+
+        if split:
+            root, csv_extension = os.path.splitext(self.__csv_file_path)
+            file_path = f'{root}_part{len(self.__files) + 1:04d}{csv_extension}{extension}'
+        elif self.__csv_file_path.endswith(extension):
+            file_path = self.__csv_file_path
+        else:
+            file_path = self.__csv_file_path + extension
+
+        self.__custom_logger.debug('Opening %s', file_path)
+        self.__files.append(file_path)
+        self.__send(('open', file_path))
+
+        header = self.__to_csv(pd.DataFrame(columns=columns), header=True)
+        self.__send(('data', header))
+        self.__file_rows = 0
+        self.__file_bytes = len(header)
+
+    def __to_csv(self, pandas_dataframe, header):
+        # Same options of CustomFile.create_csv_file_from_pandas_dataframe
+        return pandas_dataframe.to_csv(
+            None
+            , header=header
+            , doublequote=True
+            , sep=','
+            , index=False
+            , decimal='.'
+        ).encode(self.__encoding)
+
+    def __send(self, message):
+        if self.__worker_error is not None:
+            raise self.__worker_error
+
+        self.__queue.put(message)
+
+    def __write_worker(self):
+        output = None
+
+        try:
+            while True:
+                action, payload = self.__queue.get()
+
+                if action == 'data':
+                    output.write(payload)
+                    continue
+
+                if output is not None:
+                    output.close()
+                    output = None
+
+                if action == 'close':
+                    return
+
+                output = self.__open_output(payload)
+
+        except Exception as e:
+            self.__worker_error = e
+            self.__custom_logger.critical(f'Error while writing the csv file: {e}')
+
+            # Keep draining the queue so that the producer never blocks
+            while True:
+                action, _ = self.__queue.get()
+                if action == 'close':
+                    break
+
+        finally:
+            if output is not None:
+                output.close()
+
+    def __open_output(self, file_path):
+        if self.__compression == 'gzip':
+            return gzip.open(file_path, 'wb', compresslevel=6)
+
+        if self.__compression == 'zstd':
+            import zstandard
+
+            return zstandard.ZstdCompressor().stream_writer(open(file_path, 'wb'), closefd=True)
+
+        return open(file_path, 'wb')
@@ -1,9 +1,19 @@
 import os.path
+import threading
+import weakref
+from collections import OrderedDict
+from itertools import islice
+import time
+from contextlib import contextmanager
+from decimal import Decimal, InvalidOperation
 import jaydebeapi as jdb
 import logging
+import numpy as np
 import pandas as pd
 from .configuration_file import Configuration
 from .my_logger import CustomLogger
+from .jvm_warm_up import start_jvm_warm_up, get_jvm_warm_up
+from .metrics import instrumented, result_rows, result_bytes
 
 
 class Database:
@@ -11,23 +21,120 @@ class Database:
     __config_class = None
     __path_man_class = None
     __custom_logger = None
+    #TODO Take the value from .env file instead of hardcoding it
+    __jar_path = r'.\external_files\jt400-11.1.jar'
 
     def __call__(cls, *args, **kwargs):
         if cls.__instance is None:
             cls.__instance = super(Database, cls).__call__(*args, **kwargs)
         return cls.__instance
 
-    def __init__(self, path_manipulation_class):
+    def __init__(self, path_manipulation_class, pool_max_size=5, pool_idle_timeout=300,
+                 validation_query='SELECT 1 FROM SYSIBM.SYSDUMMY1', warm_up=False):
+        """
+        Args:
+            path_manipulation_class (PathManipulation): Used to locate the .env files
+            pool_max_size (int):    Maximum number of pooled connections for each (environment, country)
+            pool_idle_timeout (int):    Seconds after which an unused pooled connection is closed
+            validation_query (str): Cheap query executed on checkout of a pooled connection
+            warm_up (bool): If True the JVM and the JDBC driver are loaded on a background thread
+                            so that the first connection doesn't pay the whole startup time
+        """
         self.__config_class = Configuration()
         self.__custom_logger = CustomLogger('DatabaseClass').custom_logger(logging.DEBUG)
         self.__path_man_class = path_manipulation_class
-        self.__custom_logger.info(f'Initializing Database Class. Parameter: {path_manipulation_class}')
+        self.__connection_arguments = {}
+        self.__database_hosts = {}
+        self.__pool = ConnectionPool(
+            connection_factory=lambda key: self.connect_to_database(*key),
+            max_size=pool_max_size,
+            idle_timeout=pool_idle_timeout,
+            validation_query=validation_query
+        )
+        self.__custom_logger.info('Initializing Database Class. Parameter: %s', path_manipulation_class)
+
+        if warm_up:
+            general_env_secrets = self.__config_class.get_value_from_env_file(
+                self.__path_man_class.get_general_env_file()
+            )
+            start_jvm_warm_up([self.__jar_path], general_env_secrets["jdbc_driver"])
 
+    @instrumented('database.connect_to_database')
     def connect_to_database(self, environment, country):
-        self.__custom_logger.info(f"connect_to_database. Parameters: {environment}, {country}")
+        """Opens a new connection to the database of the given environment and country.
+        The .env files are read only the first time a pair is requested.
 
-        #TODO Take the value from .env file instead of hardcoding it
-        jar_path = r'.\external_files\jt400-11.1.jar'
+        Args:
+            environment (str):  Environment of the database (f.e. prod)
+            country (str):  Country of the database (f.e. it)
+
+        Returns:
+            A new jaydebeapi connection. The caller is responsible for closing it
+        """
+        self.__custom_logger.info("connect_to_database. Parameters: %s, %s", environment, country)
+
+        jdbc_driver, jdbc_url, credentials, jar_path = self.__get_connection_arguments(environment, country)
+
+        # jaydebeapi would start the JVM itself: wait for a running warm-up to finish instead
+        jvm_warm_up = get_jvm_warm_up()
+        if jvm_warm_up is not None:
+            jvm_warm_up.wait()
+
+        # Example of connection to a DB2 server
+        connection = jdb.connect(
+            jdbc_driver
+            , jdbc_url
+            , credentials
+            , jar_path
+        )
+
+        self.__custom_logger.debug("Established database connection %s.", connection)
+
+        return connection
+
+    @contextmanager
+    def connection(self, environment, country):
+        """Context manager that borrows a pooled connection and gives it back on exit.
+
+        Example:
+            with db.connection("prod", "it") as conn:
+                df = queries.get_pandas_df_from_query("query.sql", conn, None)
+
+        Args:
+            environment (str):  Environment of the database (f.e. prod)
+            country (str):  Country of the database (f.e. it)
+        """
+        self.__custom_logger.info("connection. Parameters: %s, %s", environment, country)
+        key = (environment, country)
+        connection = self.__pool.acquire(key)
+
+        try:
+            yield connection
+        except BaseException:
+            # The connection may be broken or in the middle of a transaction: it's not reused
+            self.__pool.release(key, connection, discard=True)
+            raise
+
+        self.__pool.release(key, connection)
+
+    def get_database_host(self, environment, country):
+        """Returns the host of the database of the given environment and country"""
+        self.__custom_logger.info("get_database_host. Parameters: %s, %s", environment, country)
+        self.__get_connection_arguments(environment, country)
+        return self.__database_hosts[(environment, country)]
+
+    def close_all_connections(self):
+        """Closes every idle connection held by the pool"""
+        self.__custom_logger.info(f"close_all_connections")
+        self.__pool.close_all()
+
+    def __get_connection_arguments(self, environment, country):
+        key = (environment, country)
+
+        if key in self.__connection_arguments:
+            return self.__connection_arguments[key]
+
+        jar_path = self.__jar_path
 
         country_env_path = self.__path_man_class.get_country_env_file(
             environment=environment,
@@ -43,70 +150,962 @@ class Database:
         user = country_env_secrets["db_user"]
         password = country_env_secrets["db_password"]
 
-        # Example of connection to a DB2 server
-        connection = jdb.connect(
-            jdbc_driver
-            , jdbc
-              + server
-              + ";prompt=false"
-            , [
-                user
-                , password
-            ]
-            , jar_path
+        arguments = (jdbc_driver, jdbc + server + ";prompt=false", [user, password], jar_path)
+        self.__database_hosts[key] = server
+        self.__connection_arguments[key] = arguments
+
+        return arguments
+
+
+class ConnectionPool:
+    """Thread safe pool of reusable database connections.
+
+    Connections are grouped by key (f.e. (environment, country)) and are created lazily
+    through the connection factory. An idle connection is checked with the validation
+    query before being handed out again and is closed once it stays unused for longer
+    than the idle timeout (checked on every acquire and release, for every key).
+
+    Attributes:
+        custom_logger   Instance of the custom logger class. Used for logging purposes
+        connection_factory  Callable that receives a key and returns a new connection
+        max_size    Maximum number of open connections for each key
+        idle_timeout    Seconds after which an idle connection is closed
+        validation_query    Query executed on checkout. If None the connection is not validated
+        idle_connections    Dictionary key -> list of (connection, last release time)
+        open_connections    Dictionary key -> number of open connections (idle and in use)
+        condition   Lock and condition used to wait for a free connection
+    """
+    __custom_logger = None
+    __connection_factory = None
+    __max_size = None
+    __idle_timeout = None
+    __validation_query = None
+    __idle_connections = None
+    __open_connections = None
+    __condition = None
+
+    def __init__(self, connection_factory, max_size=5, idle_timeout=300, validation_query=None):
+        self.__custom_logger = CustomLogger('ConnectionPoolClass').custom_logger(logging.DEBUG)
+        self.__custom_logger.info(
+            'Initializing ConnectionPool Class. Parameters: %s, %s, %s', max_size, idle_timeout, validation_query
         )
+        self.__connection_factory = connection_factory
+        self.__max_size = max_size
+        self.__idle_timeout = idle_timeout
+        self.__validation_query = validation_query
+        self.__idle_connections = {}
+        self.__open_connections = {}
+        self.__condition = threading.Condition()
 
-        self.__custom_logger.debug(f"Established database connection {connection}.")
+    def acquire(self, key, timeout=None):
+        """Returns a connection for the given key, reusing an idle one when possible.
 
-        return connection
+        Args:
+            key (tuple):    Key of the connection (f.e. (environment, country))
+            timeout (float):    Seconds to wait for a free connection when the pool is full.
+                                None waits forever
+
+        Raises:
+            TimeoutError    If no connection is released within the timeout
+        """
+        self.__custom_logger.info('acquire. Parameters: %s, %s', key, timeout)
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            connection = None
+
+            with self.__condition:
+                while True:
+                    self.__close_expired()
+                    idle = self.__idle_connections.get(key)
+
+                    if idle:
+                        connection, _ = idle.pop()
+                        break
+
+                    if self.__open_connections.get(key, 0) < self.__max_size:
+                        self.__open_connections[key] = self.__open_connections.get(key, 0) + 1
+                        break
+
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        self.__custom_logger.critical(f'No free connection for {key} within {timeout} seconds')
+                        raise TimeoutError(f'No free connection for {key} within {timeout} seconds')
+                    self.__condition.wait(remaining)
+
+            if connection is None:
+                try:
+                    connection = self.__connection_factory(key)
+                except Exception:
+                    self.__forget(key)
+                    raise
+                self.__custom_logger.debug('Opened new pooled connection %s for %s', connection, key)
+                return connection
+
+            if self.__is_valid(connection):
+                self.__custom_logger.debug('Reusing pooled connection %s for %s', connection, key)
+                return connection
+
+            self.__custom_logger.warning(f'Pooled connection {connection} for {key} failed validation')
+            self.__close(connection)
+            self.__forget(key)
+
+    def release(self, key, connection, discard=False):
+        """Gives a connection back to the pool.
+
+        Args:
+            key (tuple):    Key used to acquire the connection
+            connection (connection):    The connection to give back
+            discard (bool): If True the connection is closed instead of being reused
+        """
+        self.__custom_logger.info('release. Parameters: %s, %s', key, discard)
+
+        if discard:
+            self.__close(connection)
+            self.__forget(key)
+            return
+
+        with self.__condition:
+            self.__idle_connections.setdefault(key, []).append((connection, time.monotonic()))
+            self.__close_expired()
+            self.__condition.notify()
+
+    def close_all(self):
+        """Closes every idle connection. Connections in use are closed when released with discard=True"""
+        self.__custom_logger.info(f'close_all')
+
+        with self.__condition:
+            for key, idle in self.__idle_connections.items():
+                for connection, _ in idle:
+                    self.__close(connection)
+                self.__open_connections[key] -= len(idle)
+            self.__idle_connections = {}
+            self.__condition.notify_all()
+
+    def __close_expired(self):
+        """Closes the idle connections of every key unused for longer than the idle timeout.
+        Called holding the condition"""
+        now = time.monotonic()
+
+        for key, idle in self.__idle_connections.items():
+            # Connections are appended on release: the expired ones are at the start of the list
+            expired = 0
+            while expired < len(idle) and now - idle[expired][1] > self.__idle_timeout:
+                expired += 1
+
+            if expired:
+                for connection, _ in idle[:expired]:
+                    self.__custom_logger.debug('Idle connection %s expired', connection)
+                    self.__close(connection)
+                del idle[:expired]
+                self.__open_connections[key] -= expired
+                self.__condition.notify(expired)
+
+    def __forget(self, key):
+        with self.__condition:
+            self.__open_connections[key] -= 1
+            self.__condition.notify()
+
+    def __is_valid(self, connection):
+        if self.__validation_query is None:
+            return True
+
+        try:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(self.__validation_query)
+                cursor.fetchall()
+            finally:
+                cursor.close()
+        except Exception as e:
+            self.__custom_logger.debug('Validation query failed: %s', e)
+            return False
+
+        return True
+
+    def __close(self, connection):
+        try:
+            connection.close()
+        except Exception as e:
+            self.__custom_logger.debug('Error while closing connection %s: %s', connection, e)
 
 
 class Queries:
     __custom_logger = None
     __path_class = None
+    __last_fetch_statistics = None
+    __reuse_prepared_statements = None
+    __statement_cache_size = None
+    __statement_caches = None
+    __statement_caches_lock = None
+    __sql_cache = None
+    __result_cache = None
+    __memory_optimizer = None
+    # java.sql.Types codes grouped by the numpy type used to store them
+    __jdbc_integer_types = (-7, -6, 5, 4, -5)
+    __jdbc_float_types = (6, 7, 8)
+    __jdbc_decimal_types = (2, 3)
+    __jdbc_boolean_types = (16,)
+    __jdbc_datetime_types = (91, 93)
 
-    def __init__(self, path_manipulation_class):
+    def __init__(self, path_manipulation_class, reuse_prepared_statements=False, statement_cache_size=32,
+                 result_cache=None, memory_optimizer=None):
+        """
+        Args:
+            path_manipulation_class (PathManipulation): Used to locate the .sql files
+            reuse_prepared_statements (bool):   If True the statements prepared on a jaydebeapi connection
+                                                are kept and reused by later executions of the same SQL
+            statement_cache_size (int): Maximum number of prepared statements kept for each connection
+            result_cache (QueryResultCache):    Optional cache of the dataframes returned by
+                                                get_pandas_df_from_query
+            memory_optimizer (DataframeMemoryOptimizer):    Optional optimizer applied to the dataframes
+                                                            returned by get_pandas_df_from_query
+        """
         self.__config_class = Configuration()
         self.__custom_logger = CustomLogger('QueriesClass').custom_logger(logging.DEBUG)
         self.__path_class = path_manipulation_class
+        self.__reuse_prepared_statements = reuse_prepared_statements
+        self.__statement_cache_size = statement_cache_size
+        self.__statement_caches = weakref.WeakKeyDictionary()
+        self.__statement_caches_lock = threading.Lock()
+        self.__sql_cache = {}
+        self.__result_cache = result_cache
+        self.__memory_optimizer = memory_optimizer
         self.__custom_logger.info(f'Initializing Queries Class')
 
-    def get_pandas_df_from_query(self, query_file, connection, parameters):
+    def get_pandas_df_from_query(self, query_file, connection, parameters, environment=None, country=None,
+                                 dtype_schema=None):
         """Returns a pandas dataframe generated from an SQL query.
 
+        When the class has a result cache and environment and country are given, the dataframe
+        is looked up in the cache first and cached after the query is executed.
+
         Args:
              query_file (str): Name of the .sql file to be executed
              connection (connection):   Connection to the database
              parameters (dict): Dictionary contains sql query parameters. Can be None
+             environment (str): Environment of the database the connection points to. Used by the cache
+             country (str): Country of the database the connection points to. Used by the cache
+             dtype_schema (dict):   Dictionary column -> dtype applied by the memory optimizer, if any
 
         Returns:
             A pandas dataframe
         """
-        self.__custom_logger.info(f'get_pandas_df_from_query. Parameters {query_file}, {connection}, {parameters}')
+        self.__custom_logger.info('get_pandas_df_from_query. Parameters %s, %s, %s', query_file, connection, parameters)
+
+        sql = self.__read_query_file(query_file, parameters)
+
+        if self.__result_cache is None or environment is None or country is None:
+            return self.__query_pandas_df(sql, connection, parameters, dtype_schema)
+
+        cache_key = self.__result_cache.make_key(sql, parameters, environment, country, dtype_schema)
+        pandas_dataframe = self.__result_cache.get(cache_key)
+
+        if pandas_dataframe is not None:
+            self.__custom_logger.debug(f"Dataframe found in the result cache")
+            return pandas_dataframe
+
+        pandas_dataframe = self.__query_pandas_df(sql, connection, parameters, dtype_schema)
+        self.__result_cache.put(cache_key, pandas_dataframe)
+
+        return pandas_dataframe
+
+    def get_pandas_df_for_parameter_sets(self, query_file, connection, parameter_sets, key_columns,
+                                         chunk_size=500, row_column='parameter_row', as_dict=False,
+                                         parameters=None):
+        """Executes an SQL query for a whole set of parameter rows with a few round trips,
+        instead of one query for each row.
+
+        The .sql file must contain the marker {parameter_filter} where the filter on the key columns
+        goes (f.e. SELECT ... FROM T WHERE STATUS = ? AND {parameter_filter}). Distinct parameter rows
+        are sent in chunks as an IN-list (one key column) or as OR-ed equalities (more key columns) and
+        each result row is mapped back to the input rows with the same key values. The other
+        placeholders of the query are bound to parameters, around the values of the filter.
+
+        Args:
+             query_file (str): Name of the .sql file to be executed
+             connection (connection):   Connection to the database
+             parameter_sets (dict|list):    Dictionary row -> list of values, as returned by
+                                            DataframeManipulations.get_parameters_list, or list of rows
+             key_columns (list):    Columns matched by the values of each row, as named in the result set
+             chunk_size (int):  Number of parameter rows sent in each query
+             row_column (str):  Name of the column holding the input row of each result row
+             as_dict (bool):    If True returns a dictionary row -> dataframe instead of a single dataframe
+             parameters (list): Other positional parameters of the query. Can be None
+
+        Returns:
+            A pandas dataframe with the row_column added, or a dictionary row -> pandas dataframe
+        """
+        self.__custom_logger.info(
+            'get_pandas_df_for_parameter_sets. Parameters %s, %s, %s, %s, %s',
+            query_file, connection, key_columns, chunk_size, parameters
+        )
+
+        sql_template = self.__read_query_file(query_file, parameters)
+        if '{parameter_filter}' not in sql_template:
+            raise ValueError(f'{query_file} does not contain the {{parameter_filter}} marker')
+
+        other_parameters = list(parameters) if parameters is not None else []
+        # The values of the filter are bound in the position of the marker
+        filter_position = sql_template[:sql_template.index('{parameter_filter}')].count('?')
+
+        if isinstance(parameter_sets, dict):
+            parameters_df = pd.DataFrame(list(parameter_sets.values()), index=list(parameter_sets.keys()),
+                                         columns=key_columns)
+        else:
+            parameters_df = pd.DataFrame(list(parameter_sets), columns=key_columns)
+
+        normalized_parameters = self.__normalize_keys(parameters_df)
+        distinct_values = parameters_df.loc[normalized_parameters.drop_duplicates().index].values.tolist()
+        self.__custom_logger.debug('%s parameter rows, %s distinct', len(parameters_df), len(distinct_values))
+
+        frames = []
+        for start in range(0, len(distinct_values), chunk_size):
+            chunk = distinct_values[start:start + chunk_size]
+
+            if len(key_columns) == 1:
+                parameter_filter = f'{key_columns[0]} IN ({", ".join(["?"] * len(chunk))})'
+            else:
+                row_filter = '(' + ' AND '.join(f'{column} = ?' for column in key_columns) + ')'
+                parameter_filter = '(' + ' OR '.join([row_filter] * len(chunk)) + ')'
+
+            sql = sql_template.replace('{parameter_filter}', parameter_filter)
+            params = (other_parameters[:filter_position] + [value for row in chunk for value in row]
+                      + other_parameters[filter_position:])
+            frames.append(self.__read_pandas_df(sql, connection, params))
+
+        # Chunks without matches are dropped: pandas deprecates concatenating empty frames
+        non_empty_frames = [frame for frame in frames if not frame.empty]
+        if non_empty_frames:
+            result = pd.concat(non_empty_frames, ignore_index=True)
+        elif frames:
+            result = frames[0]
+        else:
+            result = pd.DataFrame(columns=key_columns)
+
+        normalized_result = self.__normalize_keys(result[key_columns])
+        matches = normalized_result.reset_index(names='_result_row').merge(
+            normalized_parameters.rename_axis(row_column).reset_index(),
+            on=key_columns,
+            how='inner'
+        )
+        mapped = result.loc[matches['_result_row']].reset_index(drop=True)
+        mapped.insert(0, row_column, matches[row_column].values)
+        self.__custom_logger.debug('Executed %s queries, %s rows mapped to the parameters', len(frames), len(mapped))
+
+        if not as_dict:
+            return mapped
+
+        groups = {row: group.drop(columns=row_column).reset_index(drop=True)
+                  for row, group in mapped.groupby(row_column, sort=False)}
+
+        return {row: groups.get(row, result.iloc[0:0]) for row in parameters_df.index}
+
+    def get_pandas_df_after_watermark(self, query_file, connection, watermark_column, watermark, parameters=None,
+                                      inclusive=False, dtype_schema=None):
+        """Returns a pandas dataframe with the rows of an SQL query newer than a watermark.
+
+        The .sql file must contain the marker {watermark_filter} where the filter on the watermark
+        column goes (f.e. SELECT ... FROM T WHERE COUNTRY = ? AND {watermark_filter}). The watermark
+        is sent as a parameter in the position of the marker.
+
+        Args:
+             query_file (str): Name of the .sql file to be executed
+             connection (connection):   Connection to the database
+             watermark_column (str):    Column holding a timestamp or an increasing key
+             watermark (object):    Last value already extracted. None extracts every row
+             parameters (list): Other positional parameters of the query. Can be None
+             inclusive (bool):  If True rows equal to the watermark are extracted again
+             dtype_schema (dict):   Dictionary column -> dtype applied by the memory optimizer, if any
+
+        Returns:
+            A pandas dataframe
+        """
+        self.__custom_logger.info(
+            'get_pandas_df_after_watermark. Parameters %s, %s, %s, %s, %s, %s',
+            query_file, connection, watermark_column, watermark, parameters, inclusive
+        )
+
+        sql_template = self.__read_query_file(query_file, parameters)
+        if '{watermark_filter}' not in sql_template:
+            raise ValueError(f'{query_file} does not contain the {{watermark_filter}} marker')
+
+        params = list(parameters) if parameters is not None else []
+
+        if watermark is None:
+            sql = sql_template.replace('{watermark_filter}', '1 = 1')
+        else:
+            operator = '>=' if inclusive else '>'
+            sql = sql_template.replace('{watermark_filter}', f'{watermark_column} {operator} ?')
+            params.insert(sql_template[:sql_template.index('{watermark_filter}')].count('?'), watermark)
+
+        return self.__read_optimized_pandas_df(sql, connection, params or None, dtype_schema)
+
+    def iter_query_chunks(self, query_file, connection, parameters, chunk_size=10000, as_dataframe=True):
+        """Executes an SQL query and yields its result set in chunks fetched with cursor.fetchmany,
+        so that memory usage is bounded by the chunk size instead of the size of the result set.
+
+        Args:
+             query_file (str): Name of the .sql file to be executed
+             connection (connection):   Connection to the database
+             parameters (dict): Dictionary contains sql query parameters. Can be None
+             chunk_size (int):  Number of rows in each chunk
+             as_dataframe (bool):   If True each chunk is a pandas dataframe,
+                                    otherwise a list of row tuples
+
+        Yields:
+            A pandas dataframe or a list of rows for each chunk
+        """
+        self.__custom_logger.info(
+            'iter_query_chunks. Parameters %s, %s, %s, %s, %s',
+            query_file, connection, parameters, chunk_size, as_dataframe
+        )
+
+        sql = self.__read_query_file(query_file, parameters)
+        cursor = self.__execute(connection, sql, parameters)
+
+        try:
+            columns = [column[0] for column in cursor.description]
+            chunk_number = 0
+
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+
+                chunk_number += 1
+                self.__custom_logger.debug("Fetched chunk %s with %s rows", chunk_number, len(rows))
+
+                if as_dataframe:
+                    yield pd.DataFrame.from_records(rows, columns=columns)
+                else:
+                    yield rows
+        finally:
+            cursor.close()
+
+    def get_columnar_from_query(self, query_file, connection, parameters, batch_size=50000,
+                                output_format='pandas'):
+        """Executes an SQL query and builds its result column by column into typed arrays.
+
+        With a jaydebeapi connection the Java ResultSet is read with typed getters (getLong,
+        getDouble, getString...) into preallocated numpy arrays, one batch at a time. The values
+        are still read one cell at a time through JPype, plus wasNull for the primitive columns,
+        so the JNI round trips are the same as jaydebeapi's and the fetch is not faster than
+        get_pandas_df_from_query: what changes is the output, typed arrays with null masks
+        instead of object columns. Any other DB-API connection uses the conversion of pd.read_sql,
+        with the same typed arrays and null masks.
+        The throughput is logged and available with get_last_fetch_statistics.
+
+        Args:
+             query_file (str): Name of the .sql file to be executed
+             connection (connection):   Connection to the database
+             parameters (dict): Dictionary contains sql query parameters. Can be None
+             batch_size (int):  Number of rows converted in each batch
+             output_format (str):   'pandas' for a dataframe, 'numpy' for a dictionary
+                                    column -> array (masked where the column has NULLs)
+                                    or 'arrow' for a pyarrow Table
+
+        Returns:
+            The result set in the requested format
+        """
+        self.__custom_logger.info(
+            'get_columnar_from_query. Parameters %s, %s, %s, %s, %s',
+            query_file, connection, parameters, batch_size, output_format
+        )
+
+        if output_format not in ('pandas', 'numpy', 'arrow'):
+            raise ValueError(f'Unknown output format {output_format}')
+
+        sql = self.__read_query_file(query_file, parameters)
+        start = time.perf_counter()
+        cursor = self.__execute(connection, sql, parameters)
+
+        try:
+            # jaydebeapi keeps the java.sql.ResultSet of the last execution in _rs
+            result_set = getattr(cursor, '_rs', None)
+            if result_set is not None:
+                columns, arrays = self.__fetch_columns_from_result_set(result_set, batch_size)
+            else:
+                columns, arrays = self.__fetch_columns_from_cursor(cursor, batch_size)
+        finally:
+            cursor.close()
+
+        elapsed = time.perf_counter() - start
+        rows = len(arrays[0][0]) if arrays else 0
+        self.__last_fetch_statistics = {
+            'rows': rows,
+            'seconds': elapsed,
+            'rows_per_second': rows / elapsed if elapsed > 0 else 0.0
+        }
+        self.__custom_logger.info(
+            'Fetched %s rows in %.3f seconds (%.0f rows/sec)',
+            rows, elapsed, self.__last_fetch_statistics['rows_per_second']
+        )
+
+        return self.__columns_to_output(columns, arrays, output_format)
+
+    def get_last_fetch_statistics(self):
+        """Returns a dictionary with rows, seconds and rows_per_second of the last columnar fetch"""
+        return self.__last_fetch_statistics
+
+    # rowcount is -1 when the driver doesn't report it
+    @instrumented('queries.execute_insert', rows=lambda result, arguments: max(result or 0, 0))
+    def execute_insert(self, connection, query, params=None):
+        """Executes an insert (or any other statement) and returns the number of affected rows"""
+        self.__custom_logger.info('execute_insert. Parameters %s, %s, %s', query, connection, params)
+        cursor = connection.cursor()
+
+        if params is not None:
+            cursor.execute(query, params)
+        else:
+            cursor.execute(query)
+
+        rowcount = cursor.rowcount
+        cursor.close()
+
+        return rowcount
+
+    @instrumented('queries.execute_bulk_insert', rows=lambda result, arguments: result['rows'])
+    def execute_bulk_insert(self, connection, query, rows, batch_size=1000, commit_every=None):
+        """Inserts many rows with cursor.executemany (a JDBC batch with jaydebeapi) on a single cursor.
+        Autocommit is disabled during the load: a commit is issued every commit_every rows and at the end,
+        while a failure rolls back the rows not committed yet.
+
+        Args:
+            connection (connection):   Connection to the database
+            query (str):    Parametrized insert statement (f.e. 'INSERT INTO T (A, B) VALUES (?, ?)')
+            rows (dataframe|iterable):  Pandas dataframe or iterable of tuples with the values to insert
+            batch_size (int):   Number of rows sent to the database in each executemany
+            commit_every (int): Number of rows after which a commit is issued. None commits only at the end
+
+        Returns:
+            A dictionary with the number of rows inserted, the seconds spent and the rows/sec
+        """
+        self.__custom_logger.info(
+            'execute_bulk_insert. Parameters %s, %s, %s, %s', query, connection, batch_size, commit_every
+        )
+
+        start = time.perf_counter()
+        inserted = 0
+        not_committed = 0
+        previous_autocommit = self.__set_autocommit(connection, False)
+        cursor = self.__cursor(connection)
+
+        try:
+            for batch in self.__iter_insert_batches(rows, batch_size):
+                cursor.executemany(query, batch)
+                inserted += len(batch)
+                not_committed += len(batch)
+                self.__custom_logger.debug('Inserted batch of %s rows. Total %s', len(batch), inserted)
+
+                if commit_every is not None and not_committed >= commit_every:
+                    connection.commit()
+                    not_committed = 0
+
+            connection.commit()
+
+        except Exception as e:
+            self.__custom_logger.critical(
+                f'Bulk insert failed after {inserted} rows. Rolling back {not_committed} rows: {e}'
+            )
+            connection.rollback()
+            raise
+
+        finally:
+            cursor.close()
+            self.__set_autocommit(connection, previous_autocommit)
+
+        elapsed = time.perf_counter() - start
+        statistics = {
+            'rows': inserted,
+            'seconds': elapsed,
+            'rows_per_second': inserted / elapsed if elapsed > 0 else 0.0
+        }
+        self.__custom_logger.info(
+            'Inserted %s rows in %.3f seconds (%.0f rows/sec)', inserted, elapsed, statistics['rows_per_second']
+        )
+
+        return statistics
 
+    def clear_caches(self):
+        """Forgets the cached SQL files and closes the cached prepared statements"""
+        self.__custom_logger.info(f'clear_caches')
+        self.__sql_cache = {}
+
+        with self.__statement_caches_lock:
+            for statement_cache in self.__statement_caches.values():
+                statement_cache.close_all()
+            self.__statement_caches = weakref.WeakKeyDictionary()
+
+    def __read_query_file(self, query_file, parameters):
+        """Returns the text of a .sql file. The text is cached and read again only when the
+        modification time of the file changes"""
         query_path = self.__path_class.get_queries_path()
         query_to_execute = os.path.join(query_path, query_file)
+        modification_time = os.stat(query_to_execute).st_mtime_ns
+
+        cached = self.__sql_cache.get(query_to_execute)
+        if cached is not None and cached[0] == modification_time:
+            self.__custom_logger.debug("Get cached sql script %s with parameters %s", query_to_execute, parameters)
+            return cached[1]
 
         with open(query_to_execute) as f:
-            self.__custom_logger.debug(f"Get sql script from file {query_to_execute} with parameters {parameters}")
+            self.__custom_logger.debug("Get sql script from file %s with parameters %s", query_to_execute, parameters)
             sql = f.read()
-            self.__custom_logger.debug(f"Query: {sql}")
+            self.__custom_logger.debug("Query: %s", sql)
+
+        self.__sql_cache[query_to_execute] = (modification_time, sql)
+
+        return sql
+
+    # Only the queries actually executed: the cache lookups are timed by QueryResultCache.get
+    @instrumented('queries.get_pandas_df_from_query', rows=result_rows, bytes_read=result_bytes)
+    def __query_pandas_df(self, sql, connection, parameters, dtype_schema):
+        return self.__read_optimized_pandas_df(sql, connection, parameters, dtype_schema)
+
+    @staticmethod
+    def __normalize_keys(pandas_dataframe):
+        """Excel values and DB2 columns differ in type and padding (CHAR, DECIMAL, REAL): the keys are
+        matched on trimmed strings, with the numbers in a canonical form so that 1, '1 ', 1.0 and
+        Decimal('1.00') are the same key"""
+        def normalize(value):
+            try:
+                return str(Decimal(value).normalize())
+            except (InvalidOperation, ValueError):
+                return value
+
+        def normalize_column(column):
+            text = column.astype(str).str.strip()
+            return text.map({value: normalize(value) for value in text.unique()})
 
+        return pandas_dataframe.apply(normalize_column)
+
+    def __read_optimized_pandas_df(self, sql, connection, parameters, dtype_schema):
+        pandas_dataframe = self.__read_pandas_df(sql, connection, parameters)
+
+        if self.__memory_optimizer is None:
+            return pandas_dataframe
+
+        return self.__memory_optimizer.optimize(pandas_dataframe, dtype_schema)
+
+    def __read_pandas_df(self, sql, connection, parameters):
         self.__custom_logger.debug("Created pandas dataframe")
 
+        if self.__reuse_prepared_statements and isinstance(connection, jdb.Connection):
+            cursor = self.__execute(connection, sql, parameters)
+            try:
+                columns = [column[0] for column in cursor.description]
+                return pd.DataFrame.from_records(cursor.fetchall(), columns=columns, coerce_float=True)
+            finally:
+                cursor.close()
+
         if parameters is not None:
             return pd.read_sql(sql, connection, params=parameters)
         else:
             return pd.read_sql(sql, connection)
 
-    def execute_insert(self, connection, query, params=None):
-        self.__custom_logger.info(f'execute_insert. Parameters {query}, {connection}, {params}')
-        cursor = connection.cursor()
+    def __cursor(self, connection):
+        if not (self.__reuse_prepared_statements and isinstance(connection, jdb.Connection)):
+            return connection.cursor()
 
-        if params is not None:
-            cursor.execute(query, params)
+        with self.__statement_caches_lock:
+            statement_cache = self.__statement_caches.get(connection)
+            if statement_cache is None:
+                statement_cache = StatementCache(self.__statement_cache_size)
+                self.__statement_caches[connection] = statement_cache
+
+        return CachedStatementCursor(connection, statement_cache)
+
+    def __execute(self, connection, sql, parameters):
+        cursor = self.__cursor(connection)
+
+        try:
+            if parameters is not None:
+                cursor.execute(sql, parameters)
+            else:
+                cursor.execute(sql)
+        except Exception:
+            cursor.close()
+            raise
+
+        return cursor
+
+    def __fetch_columns_from_result_set(self, result_set, batch_size):
+        meta = result_set.getMetaData()
+        column_count = meta.getColumnCount()
+        columns = [str(meta.getColumnLabel(i)) for i in range(1, column_count + 1)]
+        readers = [self.__get_column_reader(result_set, meta, i) for i in range(1, column_count + 1)]
+        batches = [([], []) for _ in columns]
+
+        while True:
+            values = [np.empty(batch_size, dtype=dtype) for _, dtype, _ in readers]
+            nulls = [np.zeros(batch_size, dtype=bool) for _ in readers]
+            count = 0
+
+            while count < batch_size and result_set.next():
+                for index, (getter, _, primitive) in enumerate(readers):
+                    value = getter(index + 1)
+                    # Primitive getters return 0/False for NULL: wasNull tells them apart
+                    if (result_set.wasNull() if primitive else value is None):
+                        nulls[index][count] = True
+                    else:
+                        values[index][count] = value
+                count += 1
+
+            for index in range(column_count):
+                batches[index][0].append(values[index][:count])
+                batches[index][1].append(nulls[index][:count])
+
+            self.__custom_logger.debug('Converted batch of %s rows', count)
+
+            if count < batch_size:
+                break
+
+        arrays = []
+        for index, (value_batches, null_batches) in enumerate(batches):
+            column_values = np.concatenate(value_batches)
+            column_nulls = np.concatenate(null_batches)
+            if readers[index][2] is None:
+                column_values = pd.to_datetime(column_values, errors='coerce').to_numpy()
+            arrays.append((column_values, column_nulls))
+
+        return columns, arrays
+
+    def __get_column_reader(self, result_set, meta, column_index):
+        """Returns (getter, numpy dtype, primitive) for a column of the result set.
+        primitive is None for date/time columns that are converted after the fetch"""
+        column_type = meta.getColumnType(column_index)
+
+        if column_type in self.__jdbc_decimal_types:
+            if meta.getScale(column_index) == 0 and meta.getPrecision(column_index) <= 18:
+                column_type = self.__jdbc_integer_types[-1]
+            else:
+                column_type = self.__jdbc_float_types[-1]
+
+        if column_type in self.__jdbc_integer_types:
+            return result_set.getLong, np.int64, True
+        if column_type in self.__jdbc_float_types:
+            return result_set.getDouble, np.float64, True
+        if column_type in self.__jdbc_boolean_types:
+            return result_set.getBoolean, np.bool_, True
+        if column_type in self.__jdbc_datetime_types:
+            return result_set.getString, object, None
+
+        return result_set.getString, object, False
+
+    def __fetch_columns_from_cursor(self, cursor, batch_size):
+        """Builds the columns with the same conversion of pd.read_sql, then types the object columns
+        as the JDBC path does: integers, booleans, decimals and dates with NULLs become typed arrays
+        with a null mask instead of object arrays"""
+        columns = [column[0] for column in cursor.description]
+        rows = []
+
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+
+            rows.extend(batch)
+
+        # Kept as objects: pandas would turn integer and boolean columns with NULLs into float64
+        pandas_dataframe = pd.DataFrame(rows, columns=columns, dtype=object)
+
+        return columns, [self.__to_typed_column(pandas_dataframe.iloc[:, index]) for index in range(len(columns))]
+
+    @staticmethod
+    def __to_typed_column(series):
+        nulls = series.isna().to_numpy()
+        values = series.to_numpy()
+
+        if values.dtype != object:
+            return values, nulls
+
+        inferred_type = pd.api.types.infer_dtype(values[~nulls], skipna=False)
+
+        if inferred_type in ('integer', 'boolean'):
+            typed_values = np.zeros(len(values), dtype=np.int64 if inferred_type == 'integer' else np.bool_)
+            typed_values[~nulls] = values[~nulls]
+            return typed_values, nulls
+        if inferred_type in ('floating', 'mixed-integer-float', 'decimal'):
+            return pd.to_numeric(series, errors='coerce').to_numpy(dtype=np.float64), nulls
+        if inferred_type in ('datetime', 'datetime64', 'date'):
+            return pd.to_datetime(series, errors='coerce').to_numpy(), nulls
+
+        return values, nulls
+
+    def __columns_to_output(self, columns, arrays, output_format):
+        if output_format == 'numpy':
+            return {
+                column: np.ma.MaskedArray(values, mask=nulls) if nulls.any() else values
+                for column, (values, nulls) in zip(columns, arrays)
+            }
+
+        if output_format == 'arrow':
+            import pyarrow as pa
+
+            return pa.table({
+                column: pa.array(values, mask=nulls if nulls.any() else None)
+                for column, (values, nulls) in zip(columns, arrays)
+            })
+
+        data = {}
+        for column, (values, nulls) in zip(columns, arrays):
+            if nulls.any() and values.dtype == np.int64:
+                data[column] = pd.arrays.IntegerArray(values, nulls)
+            elif nulls.any() and values.dtype == np.bool_:
+                data[column] = pd.arrays.BooleanArray(values, nulls)
+            elif nulls.any() and values.dtype == np.float64:
+                data[column] = np.where(nulls, np.nan, values)
+            elif nulls.any() and values.dtype == object:
+                values = values.copy()
+                values[nulls] = None
+                data[column] = values
+            else:
+                data[column] = values
+
+        return pd.DataFrame(data, columns=columns)
+
+    def __iter_insert_batches(self, rows, batch_size):
+        if isinstance(rows, pd.DataFrame):
+            for start in range(0, len(rows), batch_size):
+                chunk = rows.iloc[start:start + batch_size]
+                # Native python values and None for missing ones, as expected by the driver
+                yield chunk.astype(object).where(chunk.notna(), None).values.tolist()
+            return
+
+        iterator = iter(rows)
+        while True:
+            batch = [tuple(row) for row in islice(iterator, batch_size)]
+            if not batch:
+                return
+            yield batch
+
+    def __set_autocommit(self, connection, autocommit):
+        """Sets the autocommit of a jaydebeapi connection and returns the previous value.
+        Other connections (f.e. sqlite3) are already transactional and are left untouched"""
+        jconn = getattr(connection, 'jconn', None)
+
+        if jconn is None or autocommit is None:
+            return None
+
+        previous_autocommit = bool(jconn.getAutoCommit())
+        jconn.setAutoCommit(autocommit)
+
+        return previous_autocommit
+
+
+class StatementCache:
+    """Bounded LRU cache of the java.sql.PreparedStatement objects of a single connection.
+
+    A statement is taken out of the cache while a cursor uses it and put back when the
+    cursor is done, so two cursors never share the same statement at the same time.
+
+    Attributes:
+        max_size    Maximum number of statements kept. The least recently used one is closed
+        statements  Ordered dictionary sql -> prepared statement
+        lock    Lock protecting the statements
+    """
+    __max_size = None
+    __statements = None
+    __lock = None
+
+    def __init__(self, max_size=32):
+        self.__max_size = max_size
+        self.__statements = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def take(self, sql):
+        """Removes and returns the cached statement for the sql, or None if not cached"""
+        with self.__lock:
+            return self.__statements.pop(sql, None)
+
+    def put(self, sql, statement):
+        """Caches a statement no longer in use, closing any statement that doesn't fit"""
+        to_close = []
+
+        with self.__lock:
+            if sql in self.__statements:
+                to_close.append(statement)
+            else:
+                self.__statements[sql] = statement
+                while len(self.__statements) > self.__max_size:
+                    to_close.append(self.__statements.popitem(last=False)[1])
+
+        for statement in to_close:
+            statement.close()
+
+    def close_all(self):
+        with self.__lock:
+            statements = list(self.__statements.values())
+            self.__statements.clear()
+
+        for statement in statements:
+            statement.close()
+
+
+class CachedStatementCursor(jdb.Cursor):
+    """jaydebeapi cursor that takes its prepared statements from a StatementCache
+    and gives them back instead of closing them, so the server parses each SQL once.
+    It relies on the internals of jaydebeapi.Cursor (_prep, _rs, _meta, _close_last)"""
+    __statement_cache = None
+    __operation = None
+
+    def __init__(self, connection, statement_cache):
+        super().__init__(connection, connection._converters)
+        self.__statement_cache = statement_cache
+
+    def execute(self, operation, parameters=None):
+        if self._connection._closed:
+            raise jdb.Error()
+        if not parameters:
+            parameters = ()
+
+        self.__prepare(operation)
+        self._set_stmt_parms(self._prep, parameters)
+
+        try:
+            is_rs = self._prep.execute()
+        except:
+            jdb._handle_sql_exception()
+
+        if is_rs:
+            self._rs = self._prep.getResultSet()
+            self._meta = self._rs.getMetaData()
+            self.rowcount = -1
         else:
-            cursor.execute(query)
+            self.rowcount = self._prep.getUpdateCount()
 
-        cursor.close()
+    def executemany(self, operation, seq_of_parameters):
+        self.__prepare(operation)
+
+        for parameters in seq_of_parameters:
+            self._set_stmt_parms(self._prep, parameters)
+            self._prep.addBatch()
+
+        update_counts = self._prep.executeBatch()
+        self.rowcount = sum(update_counts)
+        self._close_last()
+
+    def _close_last(self):
+        if self._rs:
+            self._rs.close()
+        self._rs = None
+
+        if self._prep:
+            self.__statement_cache.put(self.__operation, self._prep)
+        self._prep = None
+        self._meta = None
+        self._description = None
+
+    def __prepare(self, operation):
+        self._close_last()
+        statement = self.__statement_cache.take(operation)
+
+        if statement is None:
+            statement = self._connection.jconn.prepareStatement(operation)
+        else:
+            statement.clearParameters()
+            statement.clearBatch()
 
+        self.__operation = operation
+        self._prep = statement
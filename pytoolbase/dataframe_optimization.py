@@ -0,0 +1,113 @@
+import logging
+import pandas as pd
+from pandas.api.types import infer_dtype, is_bool_dtype, is_float_dtype, is_integer_dtype
+from .my_logger import CustomLogger
+
+
+class DataframeMemoryOptimizer:
+    """Reduces the memory used by the dataframes loaded from the database.
+
+    A dtype schema can be given for specific columns, while the other columns are optimized
+    automatically: fixed-width CHAR strings are trimmed, low-cardinality strings become
+    categorical, the other strings are stored as Arrow-backed strings, decimals become floats
+    and numeric columns are downcast to the smallest type holding their values.
+
+    Attributes:
+        custom_logger   Instance of the custom logger class. Used for logging purposes
+        category_threshold  Maximum ratio distinct values/rows for a string column to become categorical
+        downcast_floats     If True float64 columns are downcast to float32 when possible
+        trim_strings    If True the trailing blanks of the strings (CHAR padding) are removed
+        arrow_strings   If True the strings not turned into categories use the string[pyarrow] dtype
+    """
+    __custom_logger = None
+    __category_threshold = None
+    __downcast_floats = None
+    __trim_strings = None
+    __arrow_strings = None
+
+    def __init__(self, category_threshold=0.5, downcast_floats=True, trim_strings=True, arrow_strings=True):
+        self.__custom_logger = CustomLogger('DataframeMemoryOptimizerClass').custom_logger(logging.DEBUG)
+        self.__custom_logger.info(
+            'Initializing DataframeMemoryOptimizer Class. Parameters: %s, %s, %s, %s',
+            category_threshold, downcast_floats, trim_strings, arrow_strings
+        )
+        self.__category_threshold = category_threshold
+        self.__downcast_floats = downcast_floats
+        self.__trim_strings = trim_strings
+        self.__arrow_strings = arrow_strings
+
+    def optimize(self, pandas_dataframe, dtype_schema=None):
+        """Returns a copy of the dataframe with memory optimized dtypes and logs the memory saved.
+
+        Args:
+            pandas_dataframe (dataframe):   Pandas dataframe to optimize
+            dtype_schema (dict):    Optional dictionary column -> dtype applied as is to those columns
+
+        Returns:
+            The optimized pandas dataframe
+        """
+        self.__custom_logger.info('optimize. Parameters: %s', dtype_schema)
+        dtype_schema = dtype_schema or {}
+
+        before = pandas_dataframe.memory_usage(index=True, deep=True)
+        optimized = pd.DataFrame(
+            {
+                column: (
+                    pandas_dataframe[column].astype(dtype_schema[column]) if column in dtype_schema
+                    else self.__optimize_series(pandas_dataframe[column])
+                )
+                for column in pandas_dataframe.columns
+            },
+            index=pandas_dataframe.index
+        )
+        after = optimized.memory_usage(index=True, deep=True)
+
+        for column in pandas_dataframe.columns:
+            self.__custom_logger.debug(
+                '%s: %s %s bytes -> %s %s bytes',
+                column, pandas_dataframe[column].dtype, before[column], optimized[column].dtype, after[column]
+            )
+
+        before_total = int(before.sum())
+        after_total = int(after.sum())
+        self.__custom_logger.info(
+            'Memory usage %s bytes -> %s bytes (%.1f%% saved)',
+            before_total, after_total, 100 * (1 - after_total / before_total) if before_total else 0
+        )
+
+        return optimized
+
+    def __optimize_series(self, series):
+        if is_bool_dtype(series):
+            return series
+
+        if is_integer_dtype(series):
+            return pd.to_numeric(series, downcast='integer')
+
+        if is_float_dtype(series):
+            return pd.to_numeric(series, downcast='float') if self.__downcast_floats else series
+
+        if series.dtype != object:
+            return series
+
+        inferred_type = infer_dtype(series, skipna=True)
+
+        if inferred_type in ('decimal', 'integer', 'floating', 'mixed-integer-float'):
+            return self.__optimize_series(pd.to_numeric(series, errors='coerce'))
+
+        if inferred_type != 'string':
+            return series
+
+        if self.__trim_strings:
+            series = series.str.rstrip()
+
+        if len(series) and series.nunique(dropna=True) / len(series) <= self.__category_threshold:
+            return series.astype('category')
+
+        if self.__arrow_strings:
+            try:
+                return series.astype('string[pyarrow]')
+            except ImportError:
+                self.__custom_logger.debug('pyarrow not available, %s kept as object', series.name)
+
+        return series
@@ -1,5 +1,6 @@
 from pytoolbase.my_logger import CustomLogger
 from datetime import datetime
+import numpy as np
 
 
 class DataframeManipulations:
@@ -16,23 +17,41 @@ class DataframeManipulations:
         )
         self.__env_file = self.__config_class.load_env_file()
         self.__custom_logger.info(
-            f'Initializing DataframeManipulations Class. Parameters: {config_class}, {custom_file_class}'
+            'Initializing DataframeManipulations Class. Parameters: %s, %s', config_class, custom_file_class
         )
 
-    def create_text_to_send(self, pandas_dataframe_not_grouped, pandas_dataframe_grouped, remote_path):
+    def create_text_to_send(self, pandas_dataframe_not_grouped, pandas_dataframe_grouped, remote_path, max_rows=None):
+        """Creates the HTML recap sent to the Teams chat.
+
+        Args:
+            pandas_dataframe_not_grouped (dataframe):   Rows of the first table
+            pandas_dataframe_grouped (dataframe):   Rows of the second table
+            remote_path (str):  Path of the published files, written in the footer
+            max_rows (int): Maximum number of rows rendered in each table, the others are summarized
+                            in a last row. None uses teams_message_max_rows of the .env file, if any
+
+        Returns:
+            The HTML text
+        """
         self.__custom_logger.info(
-            f'create_text_to_send. Parameters: {pandas_dataframe_not_grouped}, {pandas_dataframe_grouped}, {remote_path}'
+            'create_text_to_send. Parameters: %s, %s, %s, %s',
+            pandas_dataframe_not_grouped, pandas_dataframe_grouped, remote_path, max_rows
         )
 
+        if max_rows is None and self.__env_file.get("teams_message_max_rows"):
+            max_rows = int(self.__env_file["teams_message_max_rows"])
+
         partial_text_one = self.__create_recap_text(
             pandas_dataframe_not_grouped,
             self.__env_file["partial_text_not_grouped"],
-            self.__env_file["non_grouped_headers"].split(',')
+            self.__env_file["non_grouped_headers"].split(','),
+            max_rows
         )
         partial_text_two = self.__create_recap_text(
             pandas_dataframe_grouped,
             self.__env_file["partial_text_grouped"],
-            self.__env_file["grouped_headers"].split(',')
+            self.__env_file["grouped_headers"].split(','),
+            max_rows
         )
 
         text_to_send = rf'''<b>{self.__env_file["teams_message_title"]}</b><br>
@@ -46,33 +65,57 @@ class DataframeManipulations:
 
         return text_to_send
 
-    def __create_recap_text(self, pandas_dataframe, partial_text, headers):
+    def __create_recap_text(self, pandas_dataframe, partial_text, headers, max_rows):
         self.__custom_logger.info('__create_recap_text_not_grouped')
-        self.__custom_logger.debug(f'{pandas_dataframe}, {partial_text}, {headers}')
+        self.__custom_logger.debug('%s, %s, %s, %s', pandas_dataframe, partial_text, headers, max_rows)
 
-        partial_text = self.__dataframe_calculations(partial_text, pandas_dataframe, headers)
+        partial_text = self.__dataframe_calculations(partial_text, pandas_dataframe, headers, max_rows)
 
         return partial_text
 
-    def __dataframe_calculations(self, partial_text, pandas_dataframe, headers):
+    def __dataframe_calculations(self, partial_text, pandas_dataframe, headers, max_rows=None):
+        """Renders the rows of the table column by column and joins them once, instead of
+        concatenating one cell at a time. The sum of 'assoluto' always covers every row"""
         self.__custom_logger.info('__dataframe_calculations')
 
-        assoluto_sum = 0
-
-        for row in range(len(pandas_dataframe)):
-            # Get the summary for each row to send to the Teams chat
-            for head in headers:
-                if head == 'assoluto':
-                    assoluto_sum = assoluto_sum + pandas_dataframe[head].values[row]
-                partial_text = partial_text + rf'<td>{pandas_dataframe[head].values[row]}</td>'
-
-            partial_text = partial_text + '</tr>'
+        total_rows = len(pandas_dataframe)
+        shown_rows = total_rows if max_rows is None else min(max_rows, total_rows)
 
-        partial_text = partial_text + rf'</table><br><b>Somma Assoluta:</b> {assoluto_sum}'
-
-        return partial_text
-
-    def get_parameters_list(self, excel_path, columns_to_get):
-        self.__custom_logger.info(f'get_parameters_list. Parameters {excel_path}, {columns_to_get}')
-
-        return self.__custom_file_class.get_column_values_for_each_row(excel_path, columns_to_get)
\ No newline at end of file
+        assoluto_sum = 0
+        if 'assoluto' in headers and total_rows:
+            # cumsum adds the values in order, as the row by row sum did
+            assoluto_values = pandas_dataframe['assoluto'].values
+            if isinstance(assoluto_values, np.ndarray):
+                assoluto_sum = np.cumsum(assoluto_values)[-1]
+            else:
+                assoluto_sum = sum(assoluto_values, 0)
+
+        if headers:
+            columns = [self.__column_to_text(pandas_dataframe[head].values[:shown_rows]) for head in headers]
+            rows = ['<td>' + '</td><td>'.join(cells) + '</td></tr>' for cells in zip(*columns)]
+        else:
+            rows = ['</tr>'] * shown_rows
+
+        if shown_rows < total_rows:
+            rows.append(
+                rf'<td colspan="{max(len(headers), 1)}">... {total_rows - shown_rows} righe non mostrate '
+                rf'su {total_rows}</td></tr>'
+            )
+            self.__custom_logger.debug('%s of %s rows rendered', shown_rows, total_rows)
+
+        return ''.join([partial_text, *rows, rf'</table><br><b>Somma Assoluta:</b> {assoluto_sum}'])
+
+    @staticmethod
+    def __column_to_text(values):
+        # Same text of formatting each numpy value on its own: integer, boolean, double and datetime
+        # columns are converted by numpy in a single call. Smaller floats and timedeltas are not,
+        # numpy would print them differently
+        if isinstance(values, np.ndarray) and (values.dtype.kind in 'iubM' or values.dtype == np.float64):
+            return values.astype(str).tolist()
+
+        return [f'{value}' for value in values]
+
+    def get_parameters_list(self, excel_path, columns_to_get, read_only=False):
+        self.__custom_logger.info('get_parameters_list. Parameters %s, %s, %s', excel_path, columns_to_get, read_only)
+
+        return self.__custom_file_class.get_column_values_for_each_row(excel_path, columns_to_get, read_only)
\ No newline at end of file
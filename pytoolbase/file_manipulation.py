@@ -1,13 +1,20 @@
 import logging
 import csv
+import re
+import numpy as np
 from openpyxl.workbook import Workbook
 from openpyxl.styles import Font
-from openpyxl import load_workbook
+from openpyxl import load_workbook, LXML
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter
 import os
 from shutil import copyfile
 from .my_logger import CustomLogger
 import xlwings as xw
 from .configuration_file import Configuration
+from .csv_export import StreamingCsvWriter
+from .file_transfer import FileTransfer
+from .metrics import instrumented, increment_event, file_size, result_rows
 import formulas
 
 
@@ -21,6 +28,9 @@ class CustomFile:
     __custom_logger = None
     __db_class = None
     __cfg_class = None
+    __excel_models = None
+    __compiled_excel_models = None
+    __cell_reference_pattern = re.compile(r"^'?(?:\[(?P<book>[^\]]+)\])?(?P<sheet>[^!]+?)'?!(?P<cell>[A-Za-z]+[0-9]+)$")
 
     def __init__(self):
         """At class initialization make sure that the working folder for temporary files
@@ -28,10 +38,15 @@ class CustomFile:
         """
         self.__custom_logger = CustomLogger('CustomFileClass').custom_logger(logging.DEBUG)
         self.__custom_logger.info(f'Initializing CustomFile Class')
+        self.__excel_models = {}
+        self.__compiled_excel_models = {}
 
         if not os.path.exists(r'.\working_files'):
             os.mkdir(r'.\working_files')
 
+    @instrumented('custom_file.create_csv_file_from_pandas_dataframe',
+                  rows=lambda result, arguments: len(arguments['pandas_dataframe']),
+                  bytes_written=file_size('csv_file_path'))
     def create_csv_file_from_pandas_dataframe(self, pandas_dataframe, csv_file_path):
         """Creates a csv file from a specific sql query.
 
@@ -43,8 +58,8 @@ class CustomFile:
         Return:
             Nothing
         """
-        self.__custom_logger.info(f"create_csv_file_from_pandas_dataframe. Parameters: {csv_file_path}")
-        self.__custom_logger.debug(f"Dataframe {pandas_dataframe}.")
+        self.__custom_logger.info("create_csv_file_from_pandas_dataframe. Parameters: %s", csv_file_path)
+        self.__custom_logger.debug("Dataframe %s.", pandas_dataframe)
         
         pandas_dataframe.to_csv(
             csv_file_path
@@ -55,13 +70,166 @@ class CustomFile:
             , index=False
             , decimal='.'
         )
-        self.__custom_logger.debug(f"Created csv file {csv_file_path}.")
+        self.__custom_logger.debug("Created csv file %s.", csv_file_path)
 
-    def create_excel_file_from_csv(self, csv_file_path, excel_file_path, encoding):
+    @instrumented('custom_file.create_csv_file_from_chunks',
+                  bytes_written=lambda result, arguments: sum(os.path.getsize(path) for path in result))
+    def create_csv_file_from_chunks(self, chunks, csv_file_path, compression=None, max_rows_per_file=None,
+                                    max_bytes_per_file=None):
+        """Creates one or more csv files from an iterator of pandas dataframes, f.e. the one returned
+        by Queries.iter_query_chunks. Each chunk is written as soon as it arrives while compression
+        and disk writes run on a worker thread.
+
+        Args:
+            chunks (iterable):  Pandas dataframes to be written
+            csv_file_path (str):    Path of the csv file that has to be created
+            compression (str):  None, 'gzip' or 'zstd' (requires zstandard). The matching extension is added
+                                to the path
+            max_rows_per_file (int):    If given the output is split in files of at most this number of rows
+            max_bytes_per_file (int):   If given the output is split in files of about this uncompressed size
+
+        Return:
+            The list of files created
+        """
         self.__custom_logger.info(
-            f"create_excel_file_from_csv. Parameters: {csv_file_path}, {excel_file_path}, {encoding}"
+            "create_csv_file_from_chunks. Parameters: %s, %s, %s, %s",
+            csv_file_path, compression, max_rows_per_file, max_bytes_per_file
         )
 
+        writer = StreamingCsvWriter(csv_file_path, compression, max_rows_per_file, max_bytes_per_file)
+        try:
+            for chunk in chunks:
+                writer.write(chunk)
+        finally:
+            files = writer.close()
+        self.__custom_logger.debug("Created csv files %s.", files)
+
+        return files
+
+    def create_parquet_file_from_pandas_dataframe(self, pandas_dataframe, parquet_file_path, compression='zstd',
+                                                  row_group_size=None):
+        """Creates a parquet file from a pandas dataframe. Requires pyarrow.
+
+        Args:
+            pandas_dataframe (dataframe):   Pandas dataframe to be turned into a parquet file
+            parquet_file_path (str):    Path of the parquet file that has to be created
+            compression (str):  Compression codec: 'zstd', 'snappy', 'gzip', 'lz4' or None
+            row_group_size (int):   Maximum number of rows in each row group. None uses the pyarrow default
+        """
+        self.__custom_logger.info(
+            "create_parquet_file_from_pandas_dataframe. Parameters: %s, %s, %s",
+            parquet_file_path, compression, row_group_size
+        )
+        self.create_parquet_file_from_chunks([pandas_dataframe], parquet_file_path, compression, row_group_size)
+
+    @instrumented('custom_file.create_parquet_file_from_chunks', rows=result_rows,
+                  bytes_written=file_size('parquet_file_path'))
+    def create_parquet_file_from_chunks(self, chunks, parquet_file_path, compression='zstd', row_group_size=None):
+        """Creates a parquet file from an iterator of pandas dataframes, f.e. the one returned by
+        Queries.iter_query_chunks. Each chunk is written as soon as it arrives. Requires pyarrow.
+
+        Args:
+            chunks (iterable):  Pandas dataframes to be written. They must share the columns of the first one
+            parquet_file_path (str):    Path of the parquet file that has to be created
+            compression (str):  Compression codec: 'zstd', 'snappy', 'gzip', 'lz4' or None
+            row_group_size (int):   Maximum number of rows in each row group. None uses the pyarrow default
+
+        Return:
+            The number of rows written
+        """
+        self.__custom_logger.info(
+            "create_parquet_file_from_chunks. Parameters: %s, %s, %s", parquet_file_path, compression, row_group_size
+        )
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        writer = None
+        rows = 0
+
+        try:
+            for chunk in chunks:
+                if writer is None:
+                    table = pa.Table.from_pandas(chunk, preserve_index=False)
+                    writer = pq.ParquetWriter(parquet_file_path, table.schema, compression=compression or 'none')
+                else:
+                    table = pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False)
+
+                writer.write_table(table, row_group_size=row_group_size)
+                rows += table.num_rows
+        finally:
+            if writer is not None:
+                writer.close()
+
+        self.__custom_logger.debug("Created parquet file %s with %s rows.", parquet_file_path, rows)
+
+        return rows
+
+    @instrumented('custom_file.create_feather_file_from_pandas_dataframe',
+                  rows=lambda result, arguments: len(arguments['pandas_dataframe']),
+                  bytes_written=file_size('feather_file_path'))
+    def create_feather_file_from_pandas_dataframe(self, pandas_dataframe, feather_file_path,
+                                                  compression='uncompressed'):
+        """Creates an Arrow IPC (Feather v2) file from a pandas dataframe. Requires pyarrow.
+        Uncompressed files can be memory-mapped by read_feather_file without copying the data.
+
+        Args:
+            pandas_dataframe (dataframe):   Pandas dataframe to be turned into a feather file
+            feather_file_path (str):    Path of the feather file that has to be created
+            compression (str):  'uncompressed', 'lz4' or 'zstd'
+        """
+        self.__custom_logger.info(
+            "create_feather_file_from_pandas_dataframe. Parameters: %s, %s", feather_file_path, compression
+        )
+        import pyarrow as pa
+        import pyarrow.feather as feather
+
+        table = pa.Table.from_pandas(pandas_dataframe, preserve_index=False)
+        feather.write_feather(table, feather_file_path, compression=compression)
+
+        self.__custom_logger.debug("Created feather file %s.", feather_file_path)
+
+    def read_feather_file(self, feather_file_path, columns=None, as_arrow_table=False):
+        """Reads a feather file memory-mapping it, so that only the pages actually used are read from disk.
+
+        Args:
+            feather_file_path (str):    Path of the feather file to read
+            columns (list): Columns to read. None reads every column
+            as_arrow_table (bool):  If True returns the pyarrow Table backed by the memory map (zero-copy)
+                                    instead of a pandas dataframe
+
+        Returns:
+            A pandas dataframe or a pyarrow Table
+        """
+        self.__custom_logger.info(
+            "read_feather_file. Parameters: %s, %s, %s", feather_file_path, columns, as_arrow_table
+        )
+        import pyarrow.feather as feather
+
+        table = feather.read_table(feather_file_path, columns=columns, memory_map=True)
+
+        return table if as_arrow_table else table.to_pandas()
+
+    @instrumented('custom_file.create_excel_file_from_csv', bytes_written=file_size('excel_file_path'))
+    def create_excel_file_from_csv(self, csv_file_path, excel_file_path, encoding, write_only=False):
+        """Creates a styled Excel file from a csv file and deletes the csv file.
+
+        Args:
+            csv_file_path (str):    Path of the csv file to convert
+            excel_file_path (str):  Path of the Excel file that has to be created
+            encoding (str): Encoding of the csv file
+            write_only (bool):  If True the rows are streamed to a write-only worksheet with the styles
+                                set once per column, so memory stays constant whatever the number of rows.
+                                The streaming requires lxml
+        """
+        self.__custom_logger.info(
+            "create_excel_file_from_csv. Parameters: %s, %s, %s, %s",
+            csv_file_path, excel_file_path, encoding, write_only
+        )
+
+        if write_only:
+            self.__create_excel_file_from_csv_write_only(csv_file_path, excel_file_path, encoding)
+            return
+
         wb = Workbook()
         ws = wb.active
 
@@ -70,7 +238,7 @@ class CustomFile:
             for row in reader:
                 ws.append(row)
 
-        logging.debug("Style the file")
+        self.__custom_logger.debug("Style the file")
         ws.freeze_panes = ws['A2']
         ws.auto_filter.ref = ws.dimensions
 
@@ -93,11 +261,111 @@ class CustomFile:
         self.__custom_logger.info("Deleting the csv file")
         os.remove(csv_file_path)
 
-        self.__custom_logger.info(f"Saving the excel file at {excel_file_path}")
+        self.__custom_logger.info("Saving the excel file at %s", excel_file_path)
         wb.save(excel_file_path)
 
         self.__custom_logger.info(f"Excel file created.")
 
+    def create_excel_file_from_pandas_dataframe(self, pandas_dataframe, excel_file_path):
+        """Creates a styled Excel file directly from a pandas dataframe, without an intermediate csv file.
+
+        Args:
+            pandas_dataframe (dataframe):   Pandas dataframe to be turned into an Excel file
+            excel_file_path (str):  Path of the Excel file that has to be created
+        """
+        self.__custom_logger.info("create_excel_file_from_pandas_dataframe. Parameters: %s", excel_file_path)
+        self.create_excel_file_from_chunks([pandas_dataframe], excel_file_path)
+
+    @instrumented('custom_file.create_excel_file_from_chunks', rows=result_rows,
+                  bytes_written=file_size('excel_file_path'))
+    def create_excel_file_from_chunks(self, chunks, excel_file_path, header=None):
+        """Creates a styled Excel file from an iterator of chunks, f.e. the one returned by
+        Queries.iter_query_chunks, in a single pass: each chunk is written as soon as it arrives.
+
+        Args:
+            chunks (iterable):  Pandas dataframes or lists of rows
+            excel_file_path (str):  Path of the Excel file that has to be created
+            header (list):  Column names. If None they are taken from the first dataframe
+
+        Return:
+            The number of data rows written
+        """
+        self.__custom_logger.info("create_excel_file_from_chunks. Parameters: %s, %s", excel_file_path, header)
+        chunks = iter(chunks)
+        first_chunk = next(chunks, None)
+
+        if header is None:
+            header = [str(column) for column in first_chunk.columns] if hasattr(first_chunk, 'columns') else []
+
+        def rows():
+            chunk = first_chunk
+            while chunk is not None:
+                if hasattr(chunk, 'columns'):
+                    # Missing values become empty cells instead of nan
+                    yield from chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None)
+                else:
+                    yield from chunk
+                chunk = next(chunks, None)
+
+        return self.__write_excel_rows(header, rows(), excel_file_path)
+
+    def __create_excel_file_from_csv_write_only(self, csv_file_path, excel_file_path, encoding):
+        with open(csv_file_path, encoding=encoding) as f:
+            reader = csv.reader(f, delimiter=',')
+            self.__write_excel_rows(next(reader, []), reader, excel_file_path)
+
+        self.__custom_logger.info("Deleting the csv file")
+        os.remove(csv_file_path)
+
+    def __write_excel_rows(self, header, rows, excel_file_path):
+        """Streams the header and the rows to a write-only worksheet with the same styling
+        of create_excel_file_from_csv: frozen and bold header, autofilter and text format"""
+        if not LXML:
+            # Without lxml openpyxl builds the whole sheet XML in memory before writing it
+            self.__custom_logger.warning('lxml is not installed: the write-only export does not stream the rows')
+
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet('Sheet')
+        column_count = len(header)
+
+        # Write-only worksheets need the columns and the panes before the first row
+        self.__custom_logger.debug("Style the file")
+        for column_index in range(1, column_count + 1):
+            ws.column_dimensions[get_column_letter(column_index)].width = 25
+        ws.freeze_panes = 'A2'
+
+        header_cells = []
+        for value in header:
+            cell = WriteOnlyCell(ws, value=value)
+            cell.font = Font(bold=True)
+            header_cells.append(cell)
+        ws.append(header_cells)
+
+        # Each row is serialized on append: the same styled cells are reused for every row
+        body_cells = []
+        row_count = 0
+        for row in rows:
+            row = list(row)
+            while len(body_cells) < len(row):
+                cell = WriteOnlyCell(ws)
+                cell.number_format = '@'
+                body_cells.append(cell)
+
+            for cell, value in zip(body_cells, row):
+                cell.value = value
+            ws.append(body_cells[:len(row)])
+            row_count += 1
+
+        if column_count:
+            ws.auto_filter.ref = f'A1:{get_column_letter(column_count)}{row_count + 1}'
+
+        self.__custom_logger.info("Saving the excel file at %s", excel_file_path)
+        wb.save(excel_file_path)
+
+        self.__custom_logger.info("Excel file created. %s rows written", row_count)
+
+        return row_count
+
     def copy_file_to_remote_folder(self, local_path, remote_path):
         """Use the copyfile utility to upload a local file to a remote folder
 
@@ -105,22 +373,52 @@ class CustomFile:
             local_path  Path to the local file to be uploaded
             remote_path Path where to copy the local file
         """
-        self.__custom_logger.info(f"copy_file_to_remote_folder. Parameters: {local_path}, {remote_path}")
+        self.__custom_logger.info("copy_file_to_remote_folder. Parameters: %s, %s", local_path, remote_path)
         
         copyfile(local_path, remote_path)
 
-    def get_column_values_for_each_row(self, excel_file_path, column_indexes):
+    def copy_files_to_remote_folder(self, local_paths, remote_folder, max_workers=4, verify_checksum=True):
+        """Uploads many local files to a remote folder concurrently. Each file is written with a temporary
+        name and renamed once complete and verified; an interrupted upload is resumed by the next call.
+
+        Args:
+            local_paths (list): Paths to the local files to be uploaded
+            remote_folder (str):    Folder where to copy the local files
+            max_workers (int):  Maximum number of files copied at the same time
+            verify_checksum (bool): If True the checksum of each copy is verified before the rename
+
+        Returns:
+            A list with a dictionary of statistics (bytes, seconds, mb_per_second...) for each file
+        """
+        self.__custom_logger.info(
+            "copy_files_to_remote_folder. Parameters: %s, %s, %s", local_paths, remote_folder, max_workers
+        )
+
+        file_transfer = FileTransfer(max_workers=max_workers, verify_checksum=verify_checksum)
+
+        return file_transfer.copy_files(
+            [(local_path, os.path.join(remote_folder, os.path.basename(local_path))) for local_path in local_paths]
+        )
+
+    def get_column_values_for_each_row(self, excel_file_path, column_indexes, read_only=False):
         """
 
         Args:
             column_indexes (list):  List of column indexes to consider in the selection
             excel_file_path (str):  Path to the Excel file to open
+            read_only (bool):   If True the workbook is streamed in read-only mode and only
+                                the requested columns are read. Faster on large workbooks
 
         Returns:
             values_dict (dict): A dictionary containing relevant values
                                 retrieved from specific columns
         """
-        self.__custom_logger.info(f"get_column_values_for_each_row. Parameters: {excel_file_path}, {column_indexes}")
+        self.__custom_logger.info(
+            "get_column_values_for_each_row. Parameters: %s, %s, %s", excel_file_path, column_indexes, read_only
+        )
+
+        if read_only:
+            return dict(self.iter_column_values_for_each_row(excel_file_path, column_indexes))
 
         workbook = load_workbook(excel_file_path)
         sheet = workbook['Sheet']
@@ -141,6 +439,48 @@ class CustomFile:
 
         return values_dict
 
+    def iter_column_values_for_each_row(self, excel_file_path, column_indexes):
+        """Streams the workbook in read-only mode and yields the values of the requested columns
+        of each row, as get_column_values_for_each_row does. Empty cells are skipped.
+
+        Args:
+            excel_file_path (str):  Path to the Excel file to open
+            column_indexes (list):  List of column indexes to consider in the selection
+
+        Yields:
+            (row, value_list) for each row having at least one value
+        """
+        self.__custom_logger.info(
+            "iter_column_values_for_each_row. Parameters: %s, %s", excel_file_path, column_indexes
+        )
+
+        for i, values in self.__iter_selected_columns(excel_file_path, column_indexes):
+            value_list = [str(value).replace(' ', '') for value in values if value is not None]
+
+            if len(value_list) != 0:
+                yield i, value_list
+
+    def get_column_values_by_column(self, excel_file_path, column_indexes):
+        """Streams the workbook in read-only mode and returns the requested columns as lists.
+
+        Args:
+            excel_file_path (str):  Path to the Excel file to open
+            column_indexes (list):  List of column indexes to consider in the selection
+
+        Returns:
+            A dictionary column index -> list of values, one for each data row (None for empty cells)
+        """
+        self.__custom_logger.info("get_column_values_by_column. Parameters: %s, %s", excel_file_path, column_indexes)
+
+        columns = sorted(set(column_indexes))
+        values_by_column = {column: [] for column in columns}
+
+        for _, values in self.__iter_selected_columns(excel_file_path, columns):
+            for column, value in zip(columns, values):
+                values_by_column[column].append(value.replace(' ', '') if isinstance(value, str) else value)
+
+        return values_by_column
+
     def save_calculated_cell_value(self, excel_file_to_update):
         """
         Given a specific cell value calculated with a formula,
@@ -148,21 +488,109 @@ class CustomFile:
 
         During the process the initial formula is lost
         """
-        self.__custom_logger.info(
-            f"save_calculated_cell_value. Parameters: {excel_file_to_update}"
-        )
+        self.__custom_logger.info("save_calculated_cell_value. Parameters: %s", excel_file_to_update)
 
         # Save calculated results
         self.__custom_logger.info(f'Saving calculated results')
-        xl_model = formulas.ExcelModel().loads(excel_file_to_update).finish()
+        xl_model = self.__get_excel_model(excel_file_to_update)
         xl_model.calculate()
         xl_model.write(dirpath=r'.\external_files')
 
+    def recalculate_cells(self, excel_file_path, inputs, outputs, target_excel_file):
+        """Sets some input cells and recalculates only the output cells depending on them.
 
-    def get_list_from_env_file(self, environment_file_path, key_to_extract):
+        The formulas model of the workbook is built once and cached (it's rebuilt when the file changes),
+        and the function computing the outputs from the inputs is compiled once for each set of inputs
+        and outputs, so the following calls only evaluate the formulas between them.
+        The inputs and the calculated values are written in the target workbook, leaving the rest untouched.
+        The target is created as a copy of the source workbook if it doesn't exist yet, while the
+        source workbook is never modified, so its formulas and its cached model stay valid.
+
+        Args:
+            excel_file_path (str): Path of the workbook containing the formulas
+            inputs (dict):  Dictionary cell reference -> value (f.e. {'Sheet1!A1': 10})
+            outputs (list): Cell references to recalculate (f.e. ['Sheet1!C10'])
+            target_excel_file (str):    Workbook where the calculated values are written
+
+        Returns:
+            A dictionary output cell reference -> calculated value
+        """
         self.__custom_logger.info(
-            f"get_list_from_env_file. Parameters: {environment_file_path}, {key_to_extract}"
+            "recalculate_cells. Parameters: %s, %s, %s, %s", excel_file_path, inputs, outputs, target_excel_file
         )
+
+        input_references = [self.__to_model_reference(excel_file_path, cell) for cell in inputs]
+        output_references = [self.__to_model_reference(excel_file_path, cell) for cell in outputs]
+        xl_model = self.__get_excel_model(excel_file_path)
+
+        compiled_key = (os.path.abspath(excel_file_path), tuple(input_references), tuple(output_references))
+        compiled_model = self.__compiled_excel_models.get(compiled_key)
+        if compiled_model is None or compiled_model[0] is not xl_model:
+            self.__custom_logger.debug('Compiling model for %s -> %s', input_references, output_references)
+            compiled_model = (xl_model, xl_model.compile(inputs=input_references, outputs=output_references))
+            self.__compiled_excel_models[compiled_key] = compiled_model
+
+        results = compiled_model[1](*inputs.values())
+        if len(output_references) == 1:
+            results = [results]
+
+        calculated_values = {}
+        for cell, result in zip(outputs, results):
+            # formulas returns Ranges objects: keep the plain value of single cells
+            value = np.asarray(getattr(result, 'value', result))
+            calculated_values[cell] = value.item() if value.size == 1 else value.tolist()
+
+        if not os.path.exists(target_excel_file):
+            copyfile(excel_file_path, target_excel_file)
+
+        self.__custom_logger.info('Writing calculated values in %s', target_excel_file)
+        workbook = load_workbook(target_excel_file)
+        sheet_names = {name.upper(): name for name in workbook.sheetnames}
+
+        # Inputs are written too, so that the target workbook is consistent with the calculated values
+        values_to_write = list(zip(input_references, inputs.values())) + [
+            (reference, calculated_values[cell]) for cell, reference in zip(outputs, output_references)
+        ]
+        for reference, value in values_to_write:
+            match = self.__cell_reference_pattern.match(reference)
+            workbook[sheet_names[match['sheet'].upper()]][match['cell']] = value
+
+        workbook.save(target_excel_file)
+
+        return calculated_values
+
+    def __get_excel_model(self, excel_file_path):
+        """Returns the formulas model of the workbook, built again only when the file changes"""
+        key = os.path.abspath(excel_file_path)
+        modification_time = os.stat(excel_file_path).st_mtime_ns
+        cached = self.__excel_models.get(key)
+
+        if cached is not None and cached[0] == modification_time:
+            self.__custom_logger.debug('Using cached model of %s', excel_file_path)
+            increment_event('excel_model_cache.hit')
+            return cached[1]
+
+        self.__custom_logger.debug('Building model of %s', excel_file_path)
+        increment_event('excel_model_cache.miss')
+        xl_model = formulas.ExcelModel().loads(excel_file_path).finish()
+        self.__excel_models[key] = (modification_time, xl_model)
+
+        return xl_model
+
+    def __to_model_reference(self, excel_file_path, cell_reference):
+        """Turns a reference like Sheet1!A1 in the one used by formulas: '[book.xlsx]SHEET1'!A1.
+        formulas uppercases sheets and cells but keeps the file name as it is on disk"""
+        match = self.__cell_reference_pattern.match(cell_reference)
+
+        if match is None:
+            raise ValueError(f'Bad cell reference {cell_reference}. Expected f.e. Sheet1!A1')
+
+        book = match['book'] or os.path.basename(excel_file_path)
+
+        return f"'[{book}]{match['sheet'].upper()}'!{match['cell'].upper()}"
+
+    def get_list_from_env_file(self, environment_file_path, key_to_extract):
+        self.__custom_logger.info("get_list_from_env_file. Parameters: %s, %s", environment_file_path, key_to_extract)
         self.__cfg_class = Configuration()
 
         env_file = self.__cfg_class.get_value_from_env_file(environment_file_path)
@@ -174,3 +602,25 @@ class CustomFile:
                 list_of_values.remove(val)
 
         return list_of_values
+
+    def __iter_selected_columns(self, excel_file_path, column_indexes):
+        """Yields (row, values) for each data row, where values are the requested columns in sheet order.
+        Only the range between the first and the last requested column is read"""
+        columns = sorted(set(column_indexes))
+        if not columns:
+            return
+
+        min_column = columns[0]
+        offsets = [column - min_column for column in columns]
+        workbook = load_workbook(excel_file_path, read_only=True)
+
+        try:
+            sheet = workbook['Sheet']
+            # Row keys follow get_column_values_for_each_row: the header is row 0
+            for i, row in enumerate(
+                    sheet.iter_rows(min_row=2, min_col=min_column, max_col=columns[-1], values_only=True),
+                    start=1
+            ):
+                yield i, [row[offset] if offset < len(row) else None for offset in offsets]
+        finally:
+            workbook.close()
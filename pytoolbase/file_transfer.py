@@ -0,0 +1,168 @@
+import hashlib
+import logging
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .my_logger import CustomLogger
+
+
+class FileTransfer:
+    """Copies many files concurrently, safely and as fast as the platform allows.
+
+    Each file is copied to a temporary .part file next to the destination with the fastest
+    primitive available (copy_file_range, sendfile, or a large buffer copy) and renamed
+    atomically once complete, so readers never see half-written files. An interrupted copy
+    is resumed from the size of the .part file and checksums of source and destination
+    are compared before the rename.
+
+    Attributes:
+        custom_logger   Instance of the custom logger class. Used for logging purposes
+        max_workers Maximum number of files copied at the same time
+        verify_checksum If True source and destination checksums are compared before the rename
+        resume  If True an existing .part file is completed instead of copied again
+        buffer_size Size of the blocks used by buffered copies and checksums
+    """
+    __custom_logger = None
+    __max_workers = None
+    __verify_checksum = None
+    __resume = None
+    __buffer_size = None
+    __partial_suffix = '.part'
+
+    def __init__(self, max_workers=4, verify_checksum=True, resume=True, buffer_size=8 * 1024 * 1024):
+        self.__custom_logger = CustomLogger('FileTransferClass').custom_logger(logging.DEBUG)
+        self.__custom_logger.info(
+            'Initializing FileTransfer Class. Parameters: %s, %s, %s, %s',
+            max_workers, verify_checksum, resume, buffer_size
+        )
+        self.__max_workers = max_workers
+        self.__verify_checksum = verify_checksum
+        self.__resume = resume
+        self.__buffer_size = buffer_size
+
+    def copy_files(self, transfers):
+        """Copies the files on a bounded thread pool.
+
+        Args:
+            transfers (list):   List of (source path, destination path) pairs
+
+        Returns:
+            A list with a dictionary for each file: source, destination, bytes, copied_bytes,
+            resumed_from, seconds and mb_per_second
+
+        Raises:
+            The first error met, once every other copy is over
+        """
+        self.__custom_logger.info('copy_files. Parameters: %s', transfers)
+
+        with ThreadPoolExecutor(max_workers=self.__max_workers, thread_name_prefix='pytoolbase-transfer') as pool:
+            futures = [pool.submit(self.copy_file, source, destination) for source, destination in transfers]
+
+        results = []
+        errors = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                errors.append(e)
+
+        if errors:
+            raise errors[0]
+
+        return results
+
+    def copy_file(self, source, destination):
+        """Copies a single file through a temporary .part file, see copy_files"""
+        self.__custom_logger.info('copy_file. Parameters: %s, %s', source, destination)
+
+        partial_destination = destination + self.__partial_suffix
+        source_size = os.path.getsize(source)
+        start = time.perf_counter()
+
+        resumed_from = 0
+        if self.__resume and os.path.exists(partial_destination):
+            resumed_from = os.path.getsize(partial_destination)
+            if resumed_from > source_size:
+                resumed_from = 0
+        self.__copy_range(source, partial_destination, resumed_from)
+
+        if self.__verify_checksum and self.__checksum(source) != self.__checksum(partial_destination):
+            if resumed_from == 0:
+                os.remove(partial_destination)
+                raise IOError(f'Checksum mismatch while copying {source} to {destination}')
+
+            # The resumed part could come from a different version of the file: copy it again from scratch
+            self.__custom_logger.warning(f'Checksum mismatch on resumed copy of {source}, copying it again')
+            resumed_from = 0
+            self.__copy_range(source, partial_destination, 0)
+            if self.__checksum(source) != self.__checksum(partial_destination):
+                os.remove(partial_destination)
+                raise IOError(f'Checksum mismatch while copying {source} to {destination}')
+
+        os.replace(partial_destination, destination)
+
+        elapsed = time.perf_counter() - start
+        copied_bytes = source_size - resumed_from
+        mb_per_second = copied_bytes / 1024 / 1024 / elapsed if elapsed > 0 else 0.0
+        self.__custom_logger.info(
+            'Copied %s to %s: %s bytes (resumed from %s) in %.3f seconds, %.1f MB/s',
+            source, destination, copied_bytes, resumed_from, elapsed, mb_per_second
+        )
+
+        return {
+            'source': source,
+            'destination': destination,
+            'bytes': source_size,
+            'copied_bytes': copied_bytes,
+            'resumed_from': resumed_from,
+            'seconds': elapsed,
+            'mb_per_second': mb_per_second
+        }
+
+    def __copy_range(self, source, destination, offset):
+        """Copies source from offset to the end into destination, truncated at offset"""
+        with open(source, 'rb') as source_file, open(destination, 'r+b' if offset else 'wb') as destination_file:
+            destination_file.truncate(offset)
+            destination_file.seek(offset)
+            source_file.seek(offset)
+            size = os.fstat(source_file.fileno()).st_size
+
+            for kernel_copy in (self.__copy_file_range, self.__sendfile):
+                try:
+                    kernel_copy(source_file.fileno(), destination_file.fileno(), size - offset)
+                    return
+                except (AttributeError, OSError) as e:
+                    # Not available on this platform or file system (f.e. network shares on Windows):
+                    # the next method restarts from what was actually copied
+                    self.__custom_logger.debug('Falling back from %s: %s', kernel_copy.__name__, e)
+                    offset = os.lseek(destination_file.fileno(), 0, os.SEEK_CUR)
+                    destination_file.seek(offset)
+                    source_file.seek(offset)
+
+            shutil.copyfileobj(source_file, destination_file, self.__buffer_size)
+
+    @staticmethod
+    def __copy_file_range(source_descriptor, destination_descriptor, remaining):
+        while remaining > 0:
+            copied = os.copy_file_range(source_descriptor, destination_descriptor, remaining)
+            if copied == 0:
+                break
+            remaining -= copied
+
+    @staticmethod
+    def __sendfile(source_descriptor, destination_descriptor, remaining):
+        while remaining > 0:
+            sent = os.sendfile(destination_descriptor, source_descriptor, None, remaining)
+            if sent == 0:
+                break
+            remaining -= sent
+
+    def __checksum(self, file_path):
+        digest = hashlib.blake2b()
+
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(self.__buffer_size), b''):
+                digest.update(block)
+
+        return digest.hexdigest()
@@ -0,0 +1,291 @@
+import datetime
+import decimal
+import json
+import logging
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+from .my_logger import CustomLogger
+
+
+class WatermarkStore:
+    """Local JSON file keeping the last extracted watermark of each incremental extraction.
+
+    The file is read again before every change and replaced atomically, so several
+    processes can share it as long as they don't update the same key at the same time.
+
+    Attributes:
+        custom_logger   Instance of the custom logger class. Used for logging purposes
+        state_path  Path of the JSON file
+        lock    Lock protecting the file inside the process
+    """
+    __custom_logger = None
+    __state_path = None
+    __lock = None
+
+    def __init__(self, state_path=r'.\working_files\watermarks.json'):
+        self.__custom_logger = CustomLogger('WatermarkStoreClass').custom_logger(logging.DEBUG)
+        self.__custom_logger.info('Initializing WatermarkStore Class. Parameters: %s', state_path)
+        self.__state_path = state_path
+        self.__lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the state of key (watermark, column, rows, updated) or None if it was never extracted"""
+        with self.__lock:
+            return self.__load().get(key)
+
+    def set(self, key, watermark, column, rows):
+        """Saves the watermark reached by the last extraction of key"""
+        self.__custom_logger.info('set. Parameters: %s, %s, %s, %s', key, watermark, column, rows)
+
+        with self.__lock:
+            state = self.__load()
+            state[key] = {
+                'watermark': watermark,
+                'column': column,
+                'rows': rows,
+                'updated': datetime.datetime.now().isoformat(sep=' ', timespec='seconds')
+            }
+            self.__save(state)
+
+    def remove(self, key):
+        """Forgets the watermark of key, so that the next extraction is a full one"""
+        self.__custom_logger.info('remove. Parameters: %s', key)
+
+        with self.__lock:
+            state = self.__load()
+            if state.pop(key, None) is not None:
+                self.__save(state)
+
+    def __load(self):
+        if not os.path.exists(self.__state_path):
+            return {}
+
+        with open(self.__state_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def __save(self, state):
+        folder = os.path.dirname(self.__state_path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        temporary_path = f'{self.__state_path}.{os.getpid()}.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+        os.replace(temporary_path, self.__state_path)
+
+
+class IncrementalExtractor:
+    """Extracts only the rows changed since the previous run and adds them to a parquet or csv file.
+
+    The watermark (a timestamp or an increasing key) reached by each query/environment/country
+    is kept in a WatermarkStore. The next run fetches only the rows after it with
+    Queries.get_pandas_df_after_watermark, so the .sql file needs the {watermark_filter} marker.
+    Without key columns the new rows are appended to the output; with key columns they replace
+    the existing rows with the same keys. The watermark is saved only once the output is written.
+
+    Attributes:
+        custom_logger   Instance of the custom logger class. Used for logging purposes
+        queries_class   Instance of the Queries class. Used to execute the query
+        custom_file_class   Instance of the CustomFile class. Used to write the output files
+        state_store Instance of the WatermarkStore class
+    """
+    __custom_logger = None
+    __queries_class = None
+    __custom_file_class = None
+    __state_store = None
+
+    def __init__(self, queries_class, custom_file_class=None, state_store=None):
+        self.__custom_logger = CustomLogger('IncrementalExtractorClass').custom_logger(logging.DEBUG)
+        self.__custom_logger.info('Initializing IncrementalExtractor Class. Parameters: %s', state_store)
+
+        if custom_file_class is None:
+            from .file_manipulation import CustomFile
+            custom_file_class = CustomFile()
+
+        self.__queries_class = queries_class
+        self.__custom_file_class = custom_file_class
+        self.__state_store = state_store if state_store is not None else WatermarkStore()
+
+    @staticmethod
+    def make_key(query_file, environment, country):
+        """Returns the key of the watermark of a query executed against the database of environment and country"""
+        return f'{environment}/{country}/{query_file}'
+
+    def extract(self, query_file, connection, environment, country, watermark_column, output_path,
+                parameters=None, key_columns=None, initial_watermark=None, inclusive=None):
+        """Extracts the rows after the saved watermark and adds them to the output file.
+
+        Args:
+            query_file (str):   Name of the .sql file to be executed
+            connection (connection):    Connection to the database of environment and country
+            environment (str):  Environment of the database. Part of the watermark key
+            country (str):  Country of the database. Part of the watermark key
+            watermark_column (str): Column holding a timestamp or an increasing key, as named in
+                                    both the query and the result set
+            output_path (str):  Parquet (.parquet) or csv (.csv) file holding the extracted rows
+            parameters (list):  Other positional parameters of the query. Can be None
+            key_columns (list): If given the new rows replace the existing rows with the same keys.
+                                Otherwise they are appended
+            initial_watermark (object): Watermark used when none is saved. None extracts every row
+            inclusive (bool):   If True rows equal to the watermark are extracted again, so rows
+                                committed later with the same timestamp are not lost. Defaults to
+                                True with key columns (the rows are merged) and False without
+
+        Returns:
+            A dictionary with mode (full, append, merge or unchanged), rows (fetched),
+            output_rows (None when appending to a csv file), previous_watermark, watermark and seconds
+        """
+        self.__custom_logger.info(
+            'extract. Parameters: %s, %s, %s, %s, %s, %s, %s',
+            query_file, environment, country, watermark_column, output_path, parameters, key_columns
+        )
+        start = time.perf_counter()
+        output_format = self.__get_output_format(output_path)
+
+        key = self.make_key(query_file, environment, country)
+        state = self.__state_store.get(key)
+        output_exists = os.path.exists(output_path)
+        previous_watermark = initial_watermark
+        if state is not None and output_exists:
+            previous_watermark = state['watermark']
+        elif state is not None:
+            self.__custom_logger.warning(f'{output_path} is missing: extracting again from {initial_watermark}')
+
+        if inclusive is None:
+            inclusive = key_columns is not None
+
+        new_rows = self.__queries_class.get_pandas_df_after_watermark(
+            query_file, connection, watermark_column, previous_watermark, parameters, inclusive
+        )
+        self.__custom_logger.debug('%s rows after watermark %s', len(new_rows), previous_watermark)
+
+        if not output_exists or previous_watermark is None:
+            mode = 'full'
+            output_rows = self.__write(new_rows, output_path, output_format)
+        elif new_rows.empty:
+            mode = 'unchanged'
+            output_rows = None
+        elif key_columns is None:
+            mode = 'append'
+            output_rows = self.__append(new_rows, output_path, output_format)
+        else:
+            mode = 'merge'
+            output_rows = self.__merge(new_rows, output_path, output_format, key_columns)
+
+        watermark = previous_watermark
+        if not new_rows.empty:
+            watermark = self.__to_state_value(new_rows[watermark_column].max())
+            if isinstance(previous_watermark, type(watermark)) and previous_watermark > watermark:
+                watermark = previous_watermark
+        self.__state_store.set(key, watermark, watermark_column, len(new_rows))
+
+        elapsed = time.perf_counter() - start
+        self.__custom_logger.info(
+            'Incremental extraction of %s (%s): %s rows in %.3f seconds, watermark %s -> %s',
+            key, mode, len(new_rows), elapsed, previous_watermark, watermark
+        )
+
+        return {
+            'mode': mode,
+            'rows': len(new_rows),
+            'output_rows': output_rows,
+            'previous_watermark': previous_watermark,
+            'watermark': watermark,
+            'seconds': elapsed
+        }
+
+    def reset(self, query_file, environment, country):
+        """Forgets the watermark, so that the next extraction fetches every row again"""
+        self.__custom_logger.info('reset. Parameters: %s, %s, %s', query_file, environment, country)
+        self.__state_store.remove(self.make_key(query_file, environment, country))
+
+    def __get_output_format(self, output_path):
+        extension = os.path.splitext(output_path)[1].lower()
+        if extension not in ('.parquet', '.csv'):
+            raise ValueError(f'Unsupported output file {output_path}: use a .parquet or .csv file')
+
+        return extension[1:]
+
+    def __write(self, pandas_dataframe, output_path, output_format):
+        """Writes the whole output to a temporary file and replaces the old one atomically"""
+        temporary_path = output_path + '.tmp'
+
+        if output_format == 'parquet':
+            self.__custom_file_class.create_parquet_file_from_pandas_dataframe(pandas_dataframe, temporary_path)
+        else:
+            self.__custom_file_class.create_csv_file_from_pandas_dataframe(pandas_dataframe, temporary_path)
+        os.replace(temporary_path, output_path)
+
+        return len(pandas_dataframe)
+
+    def __read(self, output_path, output_format):
+        if output_format == 'parquet':
+            return pd.read_parquet(output_path)
+
+        return pd.read_csv(output_path, encoding='utf-8')
+
+    def __append(self, new_rows, output_path, output_format):
+        if output_format == 'parquet':
+            # Parquet files can't be extended in place: the file is rewritten, the database is not queried
+            existing_rows = self.__read(output_path, output_format)
+            return self.__write(pd.concat([existing_rows, new_rows], ignore_index=True), output_path, output_format)
+
+        columns = pd.read_csv(output_path, encoding='utf-8', nrows=0).columns.tolist()
+        if sorted(columns) != sorted(new_rows.columns):
+            raise ValueError(f'The columns of {output_path} differ from the columns of the query: {columns}')
+
+        # Same options of CustomFile.create_csv_file_from_pandas_dataframe
+        new_rows[columns].to_csv(
+            output_path
+            , mode='a'
+            , encoding='utf-8'
+            , header=False
+            , doublequote=True
+            , sep=','
+            , index=False
+            , decimal='.'
+        )
+
+        return None
+
+    def __merge(self, new_rows, output_path, output_format, key_columns):
+        existing_rows = self.__read(output_path, output_format)
+
+        # Values read back from csv and values from the database differ in type and padding:
+        # match on trimmed strings
+        existing_keys = pd.MultiIndex.from_frame(
+            existing_rows[key_columns].astype(str).apply(lambda column: column.str.strip())
+        )
+        new_keys = pd.MultiIndex.from_frame(
+            new_rows[key_columns].astype(str).apply(lambda column: column.str.strip())
+        )
+        kept_rows = existing_rows[~existing_keys.isin(new_keys)]
+        self.__custom_logger.debug(
+            '%s rows replaced, %s rows added',
+            len(existing_rows) - len(kept_rows), len(new_rows) - (len(existing_rows) - len(kept_rows))
+        )
+
+        return self.__write(pd.concat([kept_rows, new_rows], ignore_index=True), output_path, output_format)
+
+    @staticmethod
+    def __to_state_value(value):
+        """Turns a watermark read from the database in a JSON value that can be sent back as a parameter"""
+        if value is None or (not isinstance(value, str) and pd.isna(value)):
+            return None
+        if isinstance(value, (pd.Timestamp, datetime.datetime)):
+            return value.isoformat(sep=' ')
+        if isinstance(value, datetime.date):
+            return value.isoformat()
+        if isinstance(value, (np.integer, np.bool_)):
+            return value.item()
+        if isinstance(value, np.floating):
+            return float(value)
+        if isinstance(value, decimal.Decimal):
+            return int(value) if value == value.to_integral_value() else str(value)
+        if isinstance(value, (str, int, float)):
+            return value
+
+        return str(value)
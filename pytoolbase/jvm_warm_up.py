@@ -0,0 +1,139 @@
+import logging
+import os
+import threading
+import time
+from .my_logger import CustomLogger
+
+
+class JvmWarmUp:
+    """Starts the JVM and loads the JDBC driver class on a background thread.
+
+    jaydebeapi starts the JVM and loads the driver jar on the first connection,
+    which costs seconds. Starting the warm-up early (at import or at construction
+    of the Database class) lets that work overlap with the rest of the program:
+    the first real connection then only waits for whatever is left.
+
+    Attributes:
+        custom_logger   Instance of the custom logger class. Used for logging purposes
+        jars    List of jar files to put on the JVM classpath
+        jdbc_driver     Fully qualified name of the JDBC driver class to load
+        thread  Background thread running the warm-up
+        duration    Seconds spent by the warm-up. None until it completes
+        error   Exception raised by the warm-up, if any
+        waited  True once a caller has waited on the warm-up
+    """
+    __custom_logger = None
+    __jars = None
+    __jdbc_driver = None
+    __thread = None
+    __duration = None
+    __error = None
+    __waited = False
+
+    def __init__(self, jars, jdbc_driver):
+        self.__custom_logger = CustomLogger('JvmWarmUpClass').custom_logger(logging.DEBUG)
+        self.__custom_logger.info('Initializing JvmWarmUp Class. Parameters: %s, %s', jars, jdbc_driver)
+        self.__jars = list(jars)
+        self.__jdbc_driver = jdbc_driver
+        self.__thread = threading.Thread(target=self.__run, name='pytoolbase-jvm-warm-up', daemon=True)
+
+    def start(self):
+        """Starts the background warm-up. Calling it more than once has no effect"""
+        self.__custom_logger.info(f'start')
+
+        if self.__thread.ident is None:
+            self.__thread.start()
+
+        return self
+
+    def is_done(self):
+        return self.__thread.ident is not None and not self.__thread.is_alive()
+
+    def wait(self, timeout=None):
+        """Blocks until the warm-up is complete. The first call logs the startup time saved,
+        that is the part of the warm-up that ran while the program was doing something else.
+
+        Args:
+            timeout (float):    Maximum seconds to wait. None waits until completion
+
+        Returns:
+            True if the warm-up completed successfully
+        """
+        self.__custom_logger.info('wait. Parameters: %s', timeout)
+        wait_start = time.perf_counter()
+        self.__thread.join(timeout)
+        waited_for = time.perf_counter() - wait_start
+
+        if self.__thread.is_alive():
+            self.__custom_logger.warning(f'JVM warm-up still running after {waited_for:.3f} seconds')
+            return False
+
+        if not self.__waited:
+            self.__waited = True
+            if self.__error is None:
+                self.__custom_logger.info(
+                    'JVM warm-up took %.3f seconds, first connection waited '
+                    '%.3f seconds. Startup time saved: %.3f seconds',
+                    self.__duration, waited_for, self.__duration - waited_for
+                )
+
+        return self.__error is None
+
+    def get_duration(self):
+        return self.__duration
+
+    def get_error(self):
+        return self.__error
+
+    def __run(self):
+        start = time.perf_counter()
+
+        try:
+            import jpype
+
+            if not jpype.isJVMStarted():
+                # Same classpath and options used by jaydebeapi when it starts the JVM itself
+                class_path = self.__jars + [
+                    path for path in os.environ.get('CLASSPATH', '').split(os.path.pathsep) if path
+                ]
+                jpype.startJVM(
+                    jpype.getDefaultJVMPath(),
+                    '-Djava.class.path=%s' % os.path.pathsep.join(class_path),
+                    ignoreUnrecognized=True,
+                    convertStrings=True
+                )
+
+            jpype.JClass(self.__jdbc_driver)
+
+        except Exception as e:
+            self.__error = e
+            self.__custom_logger.warning(f'JVM warm-up failed, the first connection will start it: {e}')
+
+        self.__duration = time.perf_counter() - start
+        self.__custom_logger.debug('JVM warm-up completed in %.3f seconds', self.__duration)
+
+
+_shared_warm_up = None
+_shared_lock = threading.Lock()
+
+
+def start_jvm_warm_up(jars, jdbc_driver):
+    """Starts the process-wide JVM warm-up, if not already running, and returns it.
+    Can be called at import time of a script to overlap the JVM startup with the rest of it.
+
+    Args:
+        jars (list):    Jar files to put on the JVM classpath (f.e. [r'.\\external_files\\jt400-11.1.jar'])
+        jdbc_driver (str):  JDBC driver class to load (f.e. 'com.ibm.as400.access.AS400JDBCDriver')
+    """
+    global _shared_warm_up
+
+    with _shared_lock:
+        if _shared_warm_up is None:
+            _shared_warm_up = JvmWarmUp(jars, jdbc_driver).start()
+
+        return _shared_warm_up
+
+
+def get_jvm_warm_up():
+    """Returns the process-wide JVM warm-up or None if it was never started"""
+    return _shared_warm_up
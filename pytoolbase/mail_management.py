@@ -8,6 +8,7 @@ from googleapiclient.errors import HttpError
 from .my_logger import CustomLogger
 import logging
 from .credentials_manager import CustomCredentialsManager
+from .metrics import instrumented
 
 
 class SendEmailWithGoogleMail:
@@ -26,10 +27,10 @@ class SendEmailWithGoogleMail:
 
     def __init__(self, email_subject, email_body, attachment_file, attachment_filename, path_manipulation_class):
         self.__custom_logger = CustomLogger('SendEmailWithGoogleMailClass').custom_logger(logging.INFO)
-        self.__custom_logger.info(f'Initializing SendEmailWithGoogleMail Class. Parameters: '
-                                  f'{email_subject}, {email_body}, {attachment_file}, {attachment_filename},'
-                                  f'{path_manipulation_class}'
-                                  )
+        self.__custom_logger.info(
+            'Initializing SendEmailWithGoogleMail Class. Parameters: %s, %s, %s, %s,%s',
+            email_subject, email_body, attachment_file, attachment_filename, path_manipulation_class
+        )
         self.__path_class = path_manipulation_class
         self.__creds_class = CustomCredentialsManager(self.__path_class)
         self.__config_class = Configuration()
@@ -41,6 +42,7 @@ class SendEmailWithGoogleMail:
                                         os.path.join(self.__path_class.get_env_path(), '.gmail-env')
                                         )
 
+    @instrumented('mail.send_email')
     def send_email(self, with_attachments, maintype=None, subtype=None):
         """Method to send an email with the Google Mail API service.
         If no type, subtype are provided then the next methods will
@@ -54,7 +56,7 @@ class SendEmailWithGoogleMail:
         Returns:
 
         """
-        self.__custom_logger.info(f'send_email. Parameters: {with_attachments}, {maintype}, {subtype}')
+        self.__custom_logger.info('send_email. Parameters: %s, %s, %s', with_attachments, maintype, subtype)
         self.__creds_class.generate_google_user_credentials()
         self.__creds = self.__creds_class.get_google_user_credentials()
 
@@ -65,7 +67,7 @@ class SendEmailWithGoogleMail:
         """
         For further info please refer to https://developers.google.com/gmail/api/guides/sending
         """
-        self.__custom_logger.info(f'__call_gmail_api_with_attachments. Parameters: {maintype}, {subtype}')
+        self.__custom_logger.info('__call_gmail_api_with_attachments. Parameters: %s, %s', maintype, subtype)
         try:
             service = build('gmail', 'v1', credentials=self.__creds)
             mime_message = EmailMessage()
@@ -0,0 +1,266 @@
+import bisect
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from .my_logger import CustomLogger
+
+
+class MetricsRegistry:
+    """In-process registry of the timings and volumes of the hot paths of the package.
+
+    Each operation (f.e. 'queries.get_pandas_df_from_query') gets a latency histogram and the
+    totals of calls, errors, rows and bytes read and written; events (f.e. cache hits) get
+    a counter. The registry is disabled by default: the instrumented methods then only pay
+    for a flag check. It is enabled with enable_metrics or the PYTOOLBASE_METRICS=1 variable.
+
+    Attributes:
+        custom_logger   Instance of the custom logger class. Used for logging purposes
+        enabled If False nothing is recorded
+        operations  Dictionary operation -> statistics
+        events  Dictionary event -> counter
+        lock    Lock protecting the statistics
+    """
+    __custom_logger = None
+    __operations = None
+    __events = None
+    __lock = None
+    # Upper bounds in seconds of the latency histogram buckets
+    __buckets = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+    enabled = False
+
+    def __init__(self, enabled=False):
+        self.__custom_logger = CustomLogger('MetricsRegistryClass').custom_logger(logging.DEBUG)
+        self.__custom_logger.info('Initializing MetricsRegistry Class. Parameters: %s', enabled)
+        self.enabled = enabled
+        self.__operations = {}
+        self.__events = {}
+        self.__lock = threading.Lock()
+
+    def observe(self, operation, seconds, rows=None, bytes_read=None, bytes_written=None, error=False):
+        """Records one call of an operation"""
+        with self.__lock:
+            statistics = self.__operations.get(operation)
+            if statistics is None:
+                statistics = {
+                    'count': 0, 'errors': 0, 'seconds_sum': 0.0, 'seconds_min': None, 'seconds_max': None,
+                    'rows': 0, 'bytes_read': 0, 'bytes_written': 0, 'buckets': [0] * (len(self.__buckets) + 1)
+                }
+                self.__operations[operation] = statistics
+
+            statistics['count'] += 1
+            statistics['errors'] += bool(error)
+            statistics['seconds_sum'] += seconds
+            statistics['seconds_min'] = seconds if statistics['seconds_min'] is None else min(
+                statistics['seconds_min'], seconds
+            )
+            statistics['seconds_max'] = seconds if statistics['seconds_max'] is None else max(
+                statistics['seconds_max'], seconds
+            )
+            statistics['buckets'][bisect.bisect_left(self.__buckets, seconds)] += 1
+            statistics['rows'] += rows or 0
+            statistics['bytes_read'] += bytes_read or 0
+            statistics['bytes_written'] += bytes_written or 0
+
+    def increment(self, event, value=1):
+        """Adds value to the counter of an event"""
+        with self.__lock:
+            self.__events[event] = self.__events.get(event, 0) + value
+
+    def snapshot(self):
+        """Returns a copy of the statistics: {'operations': {operation: statistics}, 'events': {event: counter}}.
+        The histogram of each operation is a dictionary upper bound -> cumulative count"""
+        with self.__lock:
+            operations = {}
+            for operation, statistics in self.__operations.items():
+                operations[operation] = dict(statistics)
+                operations[operation]['seconds_avg'] = statistics['seconds_sum'] / statistics['count']
+                operations[operation]['buckets'] = self.__cumulative_buckets(statistics['buckets'])
+
+            return {'operations': operations, 'events': dict(self.__events)}
+
+    def reset(self):
+        """Forgets every statistic"""
+        self.__custom_logger.info('reset')
+
+        with self.__lock:
+            self.__operations = {}
+            self.__events = {}
+
+    def write_json(self, json_file_path):
+        """Writes the snapshot to a JSON file"""
+        self.__custom_logger.info('write_json. Parameters: %s', json_file_path)
+        self.__write_atomically(json_file_path, json.dumps(self.snapshot(), indent=2, sort_keys=True))
+
+    def write_prometheus_textfile(self, textfile_path, prefix='pytoolbase'):
+        """Writes the snapshot in the Prometheus text format, f.e. for the textfile collector of node_exporter"""
+        self.__custom_logger.info('write_prometheus_textfile. Parameters: %s, %s', textfile_path, prefix)
+        snapshot = self.snapshot()
+        lines = [
+            f'# HELP {prefix}_operation_seconds Latency of the operations',
+            f'# TYPE {prefix}_operation_seconds histogram'
+        ]
+
+        for operation, statistics in sorted(snapshot['operations'].items()):
+            label = f'operation="{self.__escape(operation)}"'
+            for upper_bound, count in statistics['buckets'].items():
+                lines.append(f'{prefix}_operation_seconds_bucket{{{label},le="{upper_bound}"}} {count}')
+            lines.append(f'{prefix}_operation_seconds_sum{{{label}}} {statistics["seconds_sum"]}')
+            lines.append(f'{prefix}_operation_seconds_count{{{label}}} {statistics["count"]}')
+
+        for total in ('errors', 'rows', 'bytes_read', 'bytes_written'):
+            lines.append(f'# TYPE {prefix}_operation_{total}_total counter')
+            for operation, statistics in sorted(snapshot['operations'].items()):
+                lines.append(
+                    f'{prefix}_operation_{total}_total{{operation="{self.__escape(operation)}"}} {statistics[total]}'
+                )
+
+        lines.append(f'# TYPE {prefix}_events_total counter')
+        for event, counter in sorted(snapshot['events'].items()):
+            lines.append(f'{prefix}_events_total{{event="{self.__escape(event)}"}} {counter}')
+
+        self.__write_atomically(textfile_path, '\n'.join(lines) + '\n')
+
+    def __cumulative_buckets(self, buckets):
+        cumulative = {}
+        total = 0
+        for upper_bound, count in zip(self.__buckets + ('+Inf',), buckets):
+            total += count
+            cumulative[str(upper_bound)] = total
+
+        return cumulative
+
+    @staticmethod
+    def __escape(value):
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    @staticmethod
+    def __write_atomically(file_path, text):
+        # Readers (f.e. node_exporter) never see a half-written file
+        temporary_path = f'{file_path}.{os.getpid()}.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(temporary_path, file_path)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_metrics_registry():
+    """Returns the registry of the process, created on first use"""
+    global _registry
+
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = MetricsRegistry(os.environ.get('PYTOOLBASE_METRICS', '') in ('1', 'true', 'True'))
+
+    return _registry
+
+
+def enable_metrics():
+    get_metrics_registry().enabled = True
+
+
+def disable_metrics():
+    get_metrics_registry().enabled = False
+
+
+def increment_event(event, value=1):
+    """Adds value to the counter of an event, if the metrics are enabled"""
+    registry = get_metrics_registry()
+    if registry.enabled:
+        registry.increment(event, value)
+
+
+@contextmanager
+def measure(operation):
+    """Context manager timing a block of code. The yielded dictionary can receive the rows,
+    bytes_read and bytes_written of the block
+
+    Example:
+        with measure('custom.step') as sample:
+            rows = do_something()
+            sample['rows'] = rows
+    """
+    registry = get_metrics_registry()
+    if not registry.enabled:
+        yield {}
+        return
+
+    sample = {}
+    start = time.perf_counter()
+    error = False
+    try:
+        yield sample
+    except BaseException:
+        error = True
+        raise
+    finally:
+        registry.observe(operation, time.perf_counter() - start, error=error, **sample)
+
+
+def instrumented(operation, rows=None, bytes_read=None, bytes_written=None):
+    """Decorator timing every call of a function or method.
+
+    rows, bytes_read and bytes_written are optional callables receiving the result and a
+    dictionary with the arguments of the call by name; they run only when the metrics are enabled.
+    """
+    def decorator(function):
+        signature = inspect.signature(function)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            registry = _registry if _registry is not None else get_metrics_registry()
+            if not registry.enabled:
+                return function(*args, **kwargs)
+
+            start = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            except BaseException:
+                registry.observe(operation, time.perf_counter() - start, error=True)
+                raise
+            elapsed = time.perf_counter() - start
+
+            sample = {}
+            if rows is not None or bytes_read is not None or bytes_written is not None:
+                arguments = signature.bind(*args, **kwargs).arguments
+                for name, extractor in (('rows', rows), ('bytes_read', bytes_read), ('bytes_written', bytes_written)):
+                    if extractor is not None:
+                        try:
+                            sample[name] = extractor(result, arguments)
+                        except Exception:
+                            # A missing value must never break the instrumented call
+                            sample[name] = None
+
+            registry.observe(operation, elapsed, **sample)
+
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def result_rows(result, arguments):
+    """rows extractor: number of rows of the returned dataframe, list or counter"""
+    return result if isinstance(result, int) else len(result)
+
+
+def result_bytes(result, arguments):
+    """bytes_read extractor: memory used by the returned dataframe"""
+    return int(result.memory_usage(index=True, deep=False).sum())
+
+
+def file_size(argument):
+    """Returns a bytes_written extractor reading the size of the file passed as argument"""
+    def extractor(result, arguments):
+        return os.path.getsize(arguments[argument])
+
+    return extractor
@@ -1,9 +1,27 @@
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
+import sys
+import threading
 from datetime import date
 
 
 class CustomLogger(logging.Logger):
+    """Named logger writing to a daily file of the logs folder.
+
+    Every logger of the process shares a single QueueHandler: the log calls only put the
+    record on a queue and a background QueueListener writes it to the file of the logger,
+    with one rotating handler for each file however many classes are instantiated.
+    Worker processes started with configure_worker_logging as initializer send their
+    records to the listener of the parent process, so only one process writes each file.
+
+    Messages are formatted only when the level is enabled, in the logging style:
+    logger.debug('Query: %s', sql). Large arguments (dataframes, arrays, long strings and
+    collections) are summarized by size instead of being rendered in full. The level
+    passed to custom_logger can be overridden per logger or per module, see configure_log_levels.
+    """
     __class_name = None
 
     def __init__(self, class_name):
@@ -14,19 +32,290 @@ class CustomLogger(logging.Logger):
 
     def custom_logger(self, logging_level):
         logger = logging.getLogger(self.__class_name)
-        logger.setLevel(logging_level)
-        # Create file handler
-        file_handler = logging.FileHandler(
-            filename=os.path.join('.\logs', str(date.today()) + '-' + self.__class_name),
-            mode='w'
-        )
-        file_handler.setLevel(logging_level)
+        module_name = sys._getframe(1).f_globals.get('__name__', '')
+
+        with _lock:
+            _logger_modules[self.__class_name] = (module_name, logging_level)
+            logger.setLevel(_get_configured_level(self.__class_name, module_name, logging_level))
+
+        # The records reach the files only through the queue: a handler of the root logger
+        # would format and write them again, synchronously
+        logger.propagate = False
 
-        # Create formatter
-        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+        queue_handler = _get_queue_handler()
+        for handler in list(logger.handlers):
+            # Handlers of a previous configuration or inherited from the parent process
+            if isinstance(handler, _LogQueueHandler) and handler is not queue_handler:
+                logger.removeHandler(handler)
 
-        # Add handler and formatters to the logger
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        if queue_handler not in logger.handlers:
+            logger.addHandler(queue_handler)
 
         return logger
+
+
+def configure_logging(log_folder=r'.\logs', max_bytes=10 * 1024 * 1024, backup_count=5, when=None, interval=1):
+    """Sets the rotation of the log files. Files already open keep the previous settings.
+
+    Args:
+        log_folder (str):   Folder of the log files
+        max_bytes (int):    Size after which a file is rotated. Ignored when 'when' is given
+        backup_count (int): Number of rotated files kept
+        when (str): If given the files are rotated by time instead of size, see
+                    logging.handlers.TimedRotatingFileHandler (f.e. 'midnight', 'H')
+        interval (int): Number of 'when' units between rotations
+    """
+    # Only the default folder is created by CustomLogger
+    os.makedirs(log_folder, exist_ok=True)
+
+    with _lock:
+        _settings.update(
+            log_folder=log_folder, max_bytes=max_bytes, backup_count=backup_count, when=when, interval=interval
+        )
+
+
+def configure_log_levels(env_file_path=None, levels=None):
+    """Overrides the levels passed to CustomLogger.custom_logger, for the loggers already
+    created and for the next ones.
+
+    The levels are read from the environment variables, then from the .env file and then
+    from the levels dictionary, each one overriding the previous ones. The levels dictionaries
+    are kept across calls: a later call reading only a .env file doesn't drop them:
+        LOG_LEVEL=WARNING                           every logger
+        LOG_LEVEL_DATABASE_CONNECTION=INFO          loggers created in a module of the package
+        LOG_LEVEL_QUERIESCLASS=DEBUG                a single logger, by name
+
+    Args:
+        env_file_path (str):    Path of a .env file. Ignored if it doesn't exist
+        levels (dict):  Dictionary key (as the suffix of the variables above, or '' for every
+                        logger) -> level name or number
+    """
+    configured_levels = _read_levels(os.environ)
+
+    if env_file_path is not None and os.path.exists(env_file_path):
+        from dotenv import dotenv_values
+
+        configured_levels.update(_read_levels(dotenv_values(env_file_path)))
+
+    with _lock:
+        for key, level in (levels or {}).items():
+            _level_overrides[key.upper()] = logging.getLevelName(level.upper()) if isinstance(level, str) else level
+
+        configured_levels.update(_level_overrides)
+        _configured_levels.clear()
+        _configured_levels.update(configured_levels)
+
+        for name, (module_name, logging_level) in _logger_modules.items():
+            logging.getLogger(name).setLevel(_get_configured_level(name, module_name, logging_level))
+
+
+def get_worker_logging_queue():
+    """Returns the multiprocessing queue that worker processes use to send their records to this process"""
+    global _worker_queue, _worker_listener
+
+    with _lock:
+        _reset_after_fork()
+
+        if _worker_listener is None:
+            import multiprocessing
+
+            _worker_queue = multiprocessing.Queue(-1)
+            _worker_listener = logging.handlers.QueueListener(_worker_queue, _get_router())
+            _worker_listener.start()
+
+        return _worker_queue
+
+
+def configure_worker_logging(worker_queue):
+    """Initializer of worker processes: their loggers send the records to the queue
+    returned by get_worker_logging_queue in the parent process"""
+    global _queue_handler
+
+    with _lock:
+        _reset_after_fork(force=True)
+        _queue_handler = _LogQueueHandler(worker_queue)
+
+
+def stop_logging():
+    """Writes the queued records and closes the log files. Registered to run at exit"""
+    global _queue_handler, _listener, _worker_listener, _router
+
+    with _lock:
+        if _owner_pid != os.getpid():
+            return
+
+        for listener in (_listener, _worker_listener):
+            if listener is not None:
+                listener.stop()
+
+        if _router is not None:
+            _router.close()
+
+        _queue_handler = None
+        _listener = None
+        _worker_listener = None
+        _router = None
+
+
+class _LogQueueHandler(logging.handlers.QueueHandler):
+    """Summarizes the large arguments of a record before it is formatted and queued.
+    Runs only for the records whose level is enabled"""
+
+    def prepare(self, record):
+        if record.args:
+            if isinstance(record.args, dict):
+                record.args = {key: _summarize(value) for key, value in record.args.items()}
+            else:
+                record.args = tuple(_summarize(arg) for arg in record.args)
+
+        return super().prepare(record)
+
+
+class _FileRouter(logging.Handler):
+    """Handler of the listeners: writes each record to the rotating file of its logger"""
+
+    def __init__(self, settings, file_suffix):
+        super().__init__()
+        self.__settings = settings
+        self.__file_suffix = file_suffix
+        self.__file_handlers = {}
+        self.__formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+
+    def emit(self, record):
+        file_handler = self.__file_handlers.get(record.name)
+        if file_handler is None:
+            file_handler = self.__open(record.name)
+            self.__file_handlers[record.name] = file_handler
+
+        file_handler.handle(record)
+
+    def close(self):
+        for file_handler in self.__file_handlers.values():
+            file_handler.close()
+        self.__file_handlers = {}
+        super().close()
+
+    def __open(self, name):
+        settings = self.__settings
+        file_name = os.path.join(settings['log_folder'], str(date.today()) + '-' + name + self.__file_suffix)
+
+        if settings['when'] is not None:
+            file_handler = logging.handlers.TimedRotatingFileHandler(
+                file_name, when=settings['when'], interval=settings['interval'],
+                backupCount=settings['backup_count'], delay=True
+            )
+        else:
+            file_handler = logging.handlers.RotatingFileHandler(
+                file_name, maxBytes=settings['max_bytes'], backupCount=settings['backup_count'], delay=True
+            )
+
+        file_handler.setFormatter(self.__formatter)
+
+        return file_handler
+
+
+_max_argument_length = 2000
+_level_prefix = 'LOG_LEVEL'
+_lock = threading.RLock()
+_configured_levels = {}
+# Levels passed explicitly to configure_log_levels, applied over every .env file read later
+_level_overrides = {}
+_logger_modules = {}
+_settings = {'log_folder': r'.\logs', 'max_bytes': 10 * 1024 * 1024, 'backup_count': 5, 'when': None, 'interval': 1}
+_owner_pid = os.getpid()
+_queue_handler = None
+_listener = None
+_worker_queue = None
+_worker_listener = None
+_router = None
+
+
+def _get_queue_handler():
+    global _queue_handler, _listener
+
+    with _lock:
+        _reset_after_fork()
+
+        if _queue_handler is None:
+            log_queue = queue.SimpleQueue()
+            _queue_handler = _LogQueueHandler(log_queue)
+            _listener = logging.handlers.QueueListener(log_queue, _get_router())
+            _listener.start()
+
+        return _queue_handler
+
+
+def _summarize(arg):
+    """Returns a short description of the arguments that would be expensive to render"""
+    if isinstance(arg, str):
+        if len(arg) <= _max_argument_length:
+            return arg
+        return f'{arg[:_max_argument_length]}... ({len(arg)} characters)'
+
+    if isinstance(arg, (int, float, bool)) or arg is None:
+        return arg
+
+    module = type(arg).__module__.split('.')[0]
+    if module == 'pandas' and hasattr(arg, 'memory_usage'):
+        shape = 'x'.join(str(size) for size in arg.shape)
+        size = arg.memory_usage(deep=False)
+        size = size if isinstance(size, int) else int(size.sum())
+        return f'<{type(arg).__name__} {shape}, {size} bytes>'
+    if module in ('numpy', 'pyarrow') and hasattr(arg, 'nbytes') and getattr(arg, 'shape', None) != ():
+        shape = 'x'.join(str(size) for size in arg.shape) if hasattr(arg, 'shape') else str(len(arg))
+        return f'<{type(arg).__name__} {shape}, {arg.nbytes} bytes>'
+    if isinstance(arg, (list, tuple, set, dict)) and len(arg) > 100:
+        return f'<{type(arg).__name__} of {len(arg)} items>'
+
+    return arg
+
+
+def _read_levels(variables):
+    levels = {}
+
+    for key, value in variables.items():
+        key = key.upper()
+        if value and (key == _level_prefix or key.startswith(_level_prefix + '_')):
+            level = logging.getLevelName(value.strip().upper())
+            if isinstance(level, int):
+                levels[key[len(_level_prefix) + 1:]] = level
+
+    return levels
+
+
+def _get_configured_level(name, module_name, logging_level):
+    """Level of a logger: by logger name, then by module, then for every logger, then the one given"""
+    for key in (name.upper(), module_name.rsplit('.', 1)[-1].upper(), ''):
+        if key in _configured_levels:
+            return _configured_levels[key]
+
+    return logging_level
+
+
+def _get_router():
+    global _router
+
+    if _router is None:
+        # Processes not started with configure_worker_logging write their own files
+        import multiprocessing
+
+        file_suffix = '' if multiprocessing.parent_process() is None else f'-{os.getpid()}'
+        _router = _FileRouter(_settings, file_suffix)
+
+    return _router
+
+
+def _reset_after_fork(force=False):
+    """A forked child inherits the handlers of the parent but not its listener threads"""
+    global _queue_handler, _listener, _worker_queue, _worker_listener, _router, _owner_pid
+
+    if force or _owner_pid != os.getpid():
+        _queue_handler = None
+        _listener = None
+        _worker_queue = None
+        _worker_listener = None
+        _router = None
+        _owner_pid = os.getpid()
+
+
+atexit.register(stop_logging)
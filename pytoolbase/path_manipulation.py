@@ -1,6 +1,6 @@
 import os
 import logging
-from .my_logger import CustomLogger
+from .my_logger import CustomLogger, configure_log_levels
 
 
 class PathManipulation:
@@ -23,12 +23,15 @@ class PathManipulation:
     def __init__(self, env_path, secrets_path, query_path):
         self.__custom_logger = CustomLogger('PathManipulation').custom_logger(logging.DEBUG)
         self.__custom_logger.info(
-            f'Initializing PathManipulation Class. Parameters: {env_path}, {secrets_path}, {query_path}'
+            'Initializing PathManipulation Class. Parameters: %s, %s, %s', env_path, secrets_path, query_path
         )
         self.__env_path = env_path
         self.__secrets_path = secrets_path
         self.__query_path = query_path
 
+        # LOG_LEVEL entries of the general .env file override the levels of the loggers
+        configure_log_levels(self.get_general_env_file())
+
     def get_general_env_file(self):
         """Getter for the generic .env file
         Return:
@@ -0,0 +1,315 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import pandas as pd
+from .my_logger import CustomLogger
+
+
+class ReportPipeline:
+    """Runs declarative report jobs: query -> file -> publish -> notify.
+
+    The job definition (a python dictionary, or a YAML/JSON file) lists stages with their
+    dependencies. Stages are scheduled as a DAG on a thread pool: a stage starts as soon as
+    every stage it depends on is over, so independent queries, exports and uploads overlap.
+
+    Example of definition:
+        stages:
+          - {name: extract_it, type: query, query_file: sales.sql, environment: prod, country: it}
+          - {name: export_it, type: export, depends_on: [extract_it], format: xlsx, path: sales_it.xlsx}
+          - {name: publish_it, type: publish, depends_on: [export_it], remote_folder: '\\\\share\\reports'}
+          - {name: notify, type: notify, depends_on: [publish_it], channel: teams, hook_url: 'https://...',
+             message: 'Report published: {publish_it}'}
+
+    Stage types and keys:
+        query   query_file, environment, country, parameters (optional). Result: pandas dataframe
+        export  path, format (xlsx, csv, parquet or feather, default xlsx). The dataframes of the
+                dependencies are concatenated: at least one of them must be a query. Result: path of the file
+        publish remote_folder. Publishes the files of the dependencies. Result: remote paths
+        notify  channel (teams, google or email), message (formatted with the stage results),
+                hook_url for teams/google, subject for email (the file of the first dependency
+                is attached). Result: the message sent
+
+    Attributes:
+        custom_logger   Instance of the custom logger class. Used for logging purposes
+        path_class  Instance of the PathManipulation class. Used by queries and emails
+        connection_factory  Callable (environment, country) returning a context manager that yields
+                            a connection. Defaults to the pooled Database.connection; a local sqlite3
+                            connection can be used in tests
+        max_workers Maximum number of stages running at the same time
+        queries_class   Instance of the Queries class
+        custom_file_class   Instance of the CustomFile class
+        last_run_report Dictionary stage -> report of the last run
+    """
+    __custom_logger = None
+    __path_class = None
+    __connection_factory = None
+    __max_workers = None
+    __queries_class = None
+    __custom_file_class = None
+    __last_run_report = None
+    __lock = None
+    __required_keys = {
+        'query': ('query_file', 'environment', 'country'),
+        'export': ('path',),
+        'publish': ('remote_folder',),
+        'notify': ('channel', 'message')
+    }
+
+    def __init__(self, path_manipulation_class, connection_factory=None, max_workers=4):
+        self.__custom_logger = CustomLogger('ReportPipelineClass').custom_logger(logging.DEBUG)
+        self.__custom_logger.info(
+            'Initializing ReportPipeline Class. Parameters: %s, %s, %s',
+            path_manipulation_class, connection_factory, max_workers
+        )
+        self.__path_class = path_manipulation_class
+        self.__max_workers = max_workers
+        self.__lock = threading.Lock()
+
+        if connection_factory is None:
+            from .database_connection import Database
+            connection_factory = Database(path_manipulation_class).connection
+
+        self.__connection_factory = connection_factory
+
+    @staticmethod
+    def load_definition(definition_path):
+        """Loads a job definition from a YAML (requires PyYAML) or JSON file"""
+        with open(definition_path, encoding='utf-8') as f:
+            if definition_path.lower().endswith(('.yaml', '.yml')):
+                import yaml
+
+                return yaml.safe_load(f)
+
+            return json.load(f)
+
+    def run(self, definition, dry_run=False, raise_on_error=True):
+        """Runs the stages of the definition.
+
+        Args:
+            definition (dict|str):  Job definition or path to a YAML/JSON file containing it
+            dry_run (bool): If True the definition is only validated and the execution plan returned
+            raise_on_error (bool):  If True a RuntimeError is raised when a stage fails, once
+                                    every stage not depending on it is over
+
+        Returns:
+            A dictionary stage -> report with status (planned, done, failed or skipped), wave
+            (dry run only), seconds, result and error
+        """
+        self.__custom_logger.info('run. Parameters: %s, %s', definition, dry_run)
+
+        if isinstance(definition, str):
+            definition = self.load_definition(definition)
+
+        stages = self.__validate(definition)
+        waves = self.__plan(stages)
+
+        if dry_run:
+            self.__last_run_report = {
+                name: {'status': 'planned', 'wave': wave_index, 'type': stages[name]['type']}
+                for wave_index, wave in enumerate(waves) for name in wave
+            }
+            for wave_index, wave in enumerate(waves):
+                self.__custom_logger.info('Dry run, wave %s: %s', wave_index, wave)
+            return self.__last_run_report
+
+        report = self.__execute(stages)
+        self.__last_run_report = report
+
+        failed = [name for name, stage_report in report.items() if stage_report['status'] == 'failed']
+        if failed and raise_on_error:
+            raise RuntimeError(f'Pipeline stages failed: {failed}') from report[failed[0]]['error']
+
+        return report
+
+    def get_last_run_report(self):
+        return self.__last_run_report
+
+    def __validate(self, definition):
+        stages = {}
+
+        for stage in definition.get('stages', []):
+            name = stage.get('name')
+            if not name or name in stages:
+                raise ValueError(f'Stage without name or with a duplicated name: {stage}')
+
+            stage_type = stage.get('type')
+            if stage_type not in self.__required_keys:
+                raise ValueError(f'Stage {name} has unknown type {stage_type}')
+
+            missing = [key for key in self.__required_keys[stage_type] if key not in stage]
+            if missing:
+                raise ValueError(f'Stage {name} is missing {missing}')
+
+            stages[name] = dict(stage, depends_on=list(stage.get('depends_on', [])))
+
+        for name, stage in stages.items():
+            unknown = [dependency for dependency in stage['depends_on'] if dependency not in stages]
+            if unknown:
+                raise ValueError(f'Stage {name} depends on unknown stages {unknown}')
+
+            # Only query stages produce the dataframes an export writes
+            if stage['type'] == 'export' and not any(
+                    stages[dependency]['type'] == 'query' for dependency in stage['depends_on']):
+                raise ValueError(f'Export stage {name} does not depend on any query stage')
+
+        return stages
+
+    def __plan(self, stages):
+        """Groups the stages in waves: every stage only depends on stages of the previous waves"""
+        waves = []
+        planned = set()
+
+        while len(planned) < len(stages):
+            wave = [
+                name for name, stage in stages.items()
+                if name not in planned and all(dependency in planned for dependency in stage['depends_on'])
+            ]
+            if not wave:
+                raise ValueError(f'Cycle between stages {sorted(set(stages) - planned)}')
+
+            waves.append(wave)
+            planned.update(wave)
+
+        return waves
+
+    def __execute(self, stages):
+        report = {}
+        running = {}
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.__max_workers, thread_name_prefix='pytoolbase-pipeline') as pool:
+            while len(report) < len(stages):
+                for name, stage in stages.items():
+                    if name in report or name in running.values():
+                        continue
+
+                    dependency_status = [report.get(dependency, {}).get('status') for dependency in stage['depends_on']]
+                    if any(status in ('failed', 'skipped') for status in dependency_status):
+                        self.__custom_logger.warning(f'Stage {name} skipped: a dependency did not complete')
+                        report[name] = {'status': 'skipped', 'seconds': 0.0, 'result': None, 'error': None}
+                    elif all(status == 'done' for status in dependency_status):
+                        inputs = [report[dependency]['result'] for dependency in stage['depends_on']]
+                        results = {other: stage_report['result'] for other, stage_report in report.items()}
+                        running[pool.submit(self.__run_stage, stage, inputs, results)] = name
+
+                if not running:
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        result, elapsed = future.result()
+                        report[name] = {'status': 'done', 'seconds': elapsed, 'result': result, 'error': None}
+                    except Exception as e:
+                        self.__custom_logger.critical(f'Stage {name} failed: {e}')
+                        report[name] = {'status': 'failed', 'seconds': None, 'result': None, 'error': e}
+
+        timings = {name: stage_report['seconds'] for name, stage_report in report.items()}
+        self.__custom_logger.info(
+            'Pipeline completed in %.3f seconds. Timings: %s', time.perf_counter() - start, timings
+        )
+
+        return report
+
+    def __run_stage(self, stage, inputs, results):
+        self.__custom_logger.info('Running stage %s (%s)', stage['name'], stage['type'])
+        start = time.perf_counter()
+
+        if stage['type'] == 'query':
+            result = self.__run_query(stage)
+        elif stage['type'] == 'export':
+            result = self.__run_export(stage, inputs)
+        elif stage['type'] == 'publish':
+            result = self.__run_publish(stage, inputs)
+        else:
+            result = self.__run_notify(stage, inputs, results)
+
+        elapsed = time.perf_counter() - start
+        self.__custom_logger.debug('Stage %s completed in %.3f seconds', stage['name'], elapsed)
+
+        return result, elapsed
+
+    def __run_query(self, stage):
+        with self.__connection_factory(stage['environment'], stage['country']) as connection:
+            return self.__get_queries_class().get_pandas_df_from_query(
+                stage['query_file'], connection, stage.get('parameters')
+            )
+
+    def __run_export(self, stage, inputs):
+        dataframes = [result for result in inputs if isinstance(result, pd.DataFrame)]
+        pandas_dataframe = dataframes[0] if len(dataframes) == 1 else pd.concat(dataframes, ignore_index=True)
+        custom_file = self.__get_custom_file_class()
+        export_format = stage.get('format', 'xlsx')
+
+        if export_format == 'xlsx':
+            custom_file.create_excel_file_from_pandas_dataframe(pandas_dataframe, stage['path'])
+        elif export_format == 'csv':
+            custom_file.create_csv_file_from_pandas_dataframe(pandas_dataframe, stage['path'])
+        elif export_format == 'parquet':
+            custom_file.create_parquet_file_from_pandas_dataframe(pandas_dataframe, stage['path'])
+        elif export_format == 'feather':
+            custom_file.create_feather_file_from_pandas_dataframe(pandas_dataframe, stage['path'])
+        else:
+            raise ValueError(f'Unknown export format {export_format}')
+
+        return stage['path']
+
+    def __run_publish(self, stage, inputs):
+        local_paths = []
+        for result in inputs:
+            local_paths.extend(result if isinstance(result, list) else [result])
+
+        self.__get_custom_file_class().copy_files_to_remote_folder(local_paths, stage['remote_folder'])
+
+        return [os.path.join(stage['remote_folder'], os.path.basename(path)) for path in local_paths]
+
+    def __run_notify(self, stage, inputs, results):
+        message = stage['message'].format_map({
+            name: self.__describe_result(result) for name, result in results.items()
+        })
+
+        if stage['channel'] == 'teams':
+            from .webhooks import MicrosoftTeamsWebhook
+            MicrosoftTeamsWebhook(stage['hook_url']).send_message_to_teams_chat(message)
+        elif stage['channel'] == 'google':
+            from .webhooks import GoogleWebhook
+            GoogleWebhook(stage['hook_url']).send_message_to_google_space(message)
+        elif stage['channel'] == 'email':
+            from .mail_management import SendEmailWithGoogleMail
+            attachment = inputs[0][0] if inputs and isinstance(inputs[0], list) else (inputs[0] if inputs else None)
+            SendEmailWithGoogleMail(
+                stage.get('subject', stage['name']), message, attachment,
+                os.path.basename(attachment) if attachment else None, self.__path_class
+            ).send_email(with_attachments=attachment is not None)
+        else:
+            raise ValueError(f'Unknown notification channel {stage["channel"]}')
+
+        return message
+
+    def __describe_result(self, result):
+        if isinstance(result, pd.DataFrame):
+            return f'{len(result)} rows'
+        if isinstance(result, list):
+            return ', '.join(result)
+
+        return result
+
+    def __get_queries_class(self):
+        with self.__lock:
+            if self.__queries_class is None:
+                from .database_connection import Queries
+                self.__queries_class = Queries(self.__path_class)
+
+            return self.__queries_class
+
+    def __get_custom_file_class(self):
+        with self.__lock:
+            if self.__custom_file_class is None:
+                from .file_manipulation import CustomFile
+                self.__custom_file_class = CustomFile()
+
+            return self.__custom_file_class
@@ -0,0 +1,218 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+from .my_logger import CustomLogger
+from .metrics import increment_event, instrumented, result_rows
+
+
+class QueryResultCache:
+    """In-process cache of the dataframes returned by the queries.
+
+    Entries are keyed by the hash of the SQL text, the parameters and the environment/country
+    of the database and expire after a TTL. When the memory used by the cached dataframes
+    exceeds the memory cap, the least recently used ones are spilled to compact files on disk
+    and loaded back on the next hit. An entry that can't be spilled or loaded back is dropped:
+    the cache never makes a query fail.
+
+    Attributes:
+        custom_logger   Instance of the custom logger class. Used for logging purposes
+        ttl     Seconds after which an entry expires
+        max_memory_bytes    Memory cap of the dataframes kept in memory
+        spill_path  Folder where the spilled dataframes are written
+        spill_format    File format of the spilled dataframes: 'pickle', 'parquet' or 'feather'
+                        (the last two require pyarrow)
+        memory_entries  Ordered dictionary key -> (dataframe, size in bytes, creation time)
+        disk_entries    Dictionary key -> (file path, creation time)
+        memory_bytes    Memory used by the dataframes kept in memory
+        statistics  Dictionary of counters (hits, memory_hits, disk_hits, misses, expired, spills,
+                    spill_errors)
+        lock    Lock protecting the cache
+    """
+    __custom_logger = None
+    __ttl = None
+    __max_memory_bytes = None
+    __spill_path = None
+    __spill_format = None
+    __memory_entries = None
+    __disk_entries = None
+    __memory_bytes = 0
+    __statistics = None
+    __lock = None
+    __spill_extensions = {'parquet': '.parquet', 'feather': '.feather', 'pickle': '.pkl'}
+
+    def __init__(self, ttl=600, max_memory_bytes=256 * 1024 * 1024,
+                 spill_path=r'.\working_files\query_cache', spill_format='pickle'):
+        self.__custom_logger = CustomLogger('QueryResultCacheClass').custom_logger(logging.DEBUG)
+        self.__custom_logger.info(
+            'Initializing QueryResultCache Class. Parameters: %s, %s, %s, %s',
+            ttl, max_memory_bytes, spill_path, spill_format
+        )
+
+        if spill_format not in self.__spill_extensions:
+            raise ValueError(f'Unknown spill format {spill_format}')
+
+        self.__ttl = ttl
+        self.__max_memory_bytes = max_memory_bytes
+        self.__spill_path = spill_path
+        self.__spill_format = spill_format
+        self.__memory_entries = OrderedDict()
+        self.__disk_entries = {}
+        self.__statistics = {
+            'hits': 0, 'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'expired': 0, 'spills': 0, 'spill_errors': 0
+        }
+        self.__lock = threading.RLock()
+
+    @staticmethod
+    def make_key(sql, parameters, environment, country, dtype_schema=None):
+        """Returns the cache key of a query executed against the database of environment and country.
+        The dtype schema applied to the result is part of the key, since it changes the cached dataframe"""
+        payload = json.dumps([sql, parameters, environment, country, dtype_schema], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @instrumented('query_cache.get', rows=result_rows)
+    def get(self, key):
+        """Returns a copy of the cached dataframe or None if the key is missing or expired"""
+        self.__custom_logger.info('get. Parameters: %s', key)
+
+        with self.__lock:
+            if key in self.__memory_entries:
+                dataframe, size, created = self.__memory_entries[key]
+                if self.__is_expired(created):
+                    self.__remove(key)
+                else:
+                    self.__memory_entries.move_to_end(key)
+                    self.__statistics['hits'] += 1
+                    self.__statistics['memory_hits'] += 1
+                    increment_event('query_cache.memory_hit')
+                    return dataframe.copy()
+
+            elif key in self.__disk_entries:
+                file_path, created = self.__disk_entries[key]
+                if self.__is_expired(created):
+                    self.__remove(key)
+                else:
+                    self.__custom_logger.debug('Loading spilled dataframe %s', file_path)
+                    try:
+                        dataframe = self.__read_spilled(file_path)
+                    except Exception as e:
+                        self.__custom_logger.warning('Dropping spilled dataframe %s: %s', file_path, e)
+                        dataframe = None
+
+                    self.__remove(key)
+                    if dataframe is not None:
+                        self.__store(key, dataframe, created)
+                        self.__statistics['hits'] += 1
+                        self.__statistics['disk_hits'] += 1
+                        increment_event('query_cache.disk_hit')
+                        return dataframe.copy()
+
+            self.__statistics['misses'] += 1
+            increment_event('query_cache.miss')
+            return None
+
+    def put(self, key, dataframe):
+        """Caches a copy of the dataframe, spilling the least recently used entries if needed"""
+        self.__custom_logger.info('put. Parameters: %s', key)
+
+        with self.__lock:
+            self.__remove(key)
+            self.__store(key, dataframe.copy(), time.monotonic())
+
+    def purge_expired(self):
+        """Removes every expired entry from memory and disk"""
+        self.__custom_logger.info(f'purge_expired')
+
+        with self.__lock:
+            expired = [
+                key for key, entry in list(self.__memory_entries.items()) + list(self.__disk_entries.items())
+                if self.__is_expired(entry[-1])
+            ]
+            for key in expired:
+                self.__remove(key)
+
+    def clear(self):
+        """Removes every entry from memory and disk"""
+        self.__custom_logger.info(f'clear')
+
+        with self.__lock:
+            for key in list(self.__memory_entries) + list(self.__disk_entries):
+                self.__remove(key)
+
+    def get_statistics(self):
+        """Returns the hit/miss counters together with the current size of the cache"""
+        with self.__lock:
+            statistics = dict(self.__statistics)
+            lookups = statistics['hits'] + statistics['misses']
+            statistics['hit_ratio'] = statistics['hits'] / lookups if lookups else 0.0
+            statistics['memory_entries'] = len(self.__memory_entries)
+            statistics['disk_entries'] = len(self.__disk_entries)
+            statistics['memory_bytes'] = self.__memory_bytes
+
+            return statistics
+
+    def __is_expired(self, created):
+        expired = time.monotonic() - created > self.__ttl
+        if expired:
+            self.__statistics['expired'] += 1
+
+        return expired
+
+    def __store(self, key, dataframe, created):
+        size = int(dataframe.memory_usage(index=True, deep=True).sum())
+        self.__memory_entries[key] = (dataframe, size, created)
+        self.__memory_bytes += size
+
+        while self.__memory_bytes > self.__max_memory_bytes and self.__memory_entries:
+            self.__spill(*self.__memory_entries.popitem(last=False))
+
+    def __spill(self, key, entry):
+        dataframe, size, created = entry
+        self.__memory_bytes -= size
+
+        file_path = os.path.join(self.__spill_path, key + self.__spill_extensions[self.__spill_format])
+        self.__custom_logger.debug('Spilling dataframe of %s bytes to %s', size, file_path)
+
+        try:
+            os.makedirs(self.__spill_path, exist_ok=True)
+
+            if self.__spill_format == 'parquet':
+                dataframe.to_parquet(file_path, compression='zstd')
+            elif self.__spill_format == 'feather':
+                dataframe.reset_index(drop=True).to_feather(file_path, compression='zstd')
+            else:
+                dataframe.to_pickle(file_path, compression='gzip')
+        except Exception as e:
+            # F.e. pyarrow missing or an object column with mixed types: the entry is evicted
+            self.__custom_logger.warning('Dropping dataframe %s, it could not be spilled: %s', key, e)
+            self.__statistics['spill_errors'] += 1
+            increment_event('query_cache.spill_error')
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            return
+
+        self.__disk_entries[key] = (file_path, created)
+        self.__statistics['spills'] += 1
+        increment_event('query_cache.spill')
+
+    def __read_spilled(self, file_path):
+        if self.__spill_format == 'parquet':
+            return pd.read_parquet(file_path)
+        if self.__spill_format == 'feather':
+            return pd.read_feather(file_path)
+
+        return pd.read_pickle(file_path, compression='gzip')
+
+    def __remove(self, key):
+        if key in self.__memory_entries:
+            _, size, _ = self.__memory_entries.pop(key)
+            self.__memory_bytes -= size
+
+        if key in self.__disk_entries:
+            file_path, _ = self.__disk_entries.pop(key)
+            if os.path.exists(file_path):
+                os.remove(file_path)
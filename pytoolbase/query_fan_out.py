@@ -0,0 +1,124 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from .my_logger import CustomLogger
+
+
+class QueryFanOut:
+    """Runs the same .sql file against many (environment, country) databases concurrently.
+
+    Each query runs on a bounded thread pool with a pooled connection of the Database class.
+    A semaphore for each database host limits how many queries hit the same server at once.
+
+    Attributes:
+        custom_logger   Instance of the custom logger class. Used for logging purposes
+        db_class    Instance of the Database class. Used to borrow pooled connections
+        queries_class   Instance of the Queries class. Used to execute the query
+        max_workers Maximum number of queries running at the same time
+        max_per_host    Maximum number of queries running at the same time on the same host
+        host_semaphores Dictionary host -> semaphore
+        lock    Lock protecting the host semaphores
+    """
+    __custom_logger = None
+    __db_class = None
+    __queries_class = None
+    __max_workers = None
+    __max_per_host = None
+    __host_semaphores = None
+    __lock = None
+
+    def __init__(self, db_class, queries_class, max_workers=8, max_per_host=2):
+        self.__custom_logger = CustomLogger('QueryFanOutClass').custom_logger(logging.DEBUG)
+        self.__custom_logger.info('Initializing QueryFanOut Class. Parameters: %s, %s', max_workers, max_per_host)
+        self.__db_class = db_class
+        self.__queries_class = queries_class
+        self.__max_workers = max_workers
+        self.__max_per_host = max_per_host
+        self.__host_semaphores = {}
+        self.__lock = threading.Lock()
+
+    def run(self, query_file, targets, parameters=None, concatenate=True, tag_column='country',
+            raise_on_error=True):
+        """Executes the query on every target and collects the results.
+
+        Args:
+            query_file (str):   Name of the .sql file to be executed
+            targets (list): List of (environment, country) pairs
+            parameters (dict):  Dictionary contains sql query parameters. Can be None
+            concatenate (bool): If True the dataframes are concatenated in a single one,
+                                with the country in tag_column. Otherwise a dictionary
+                                (environment, country) -> dataframe is returned
+            tag_column (str):   Name of the column holding the country in the concatenated dataframe
+            raise_on_error (bool):  If True the first failure is raised once every query is over.
+                                    Otherwise failed targets are logged and left out of the result
+
+        Returns:
+            A tuple (result, timings) where timings is a dictionary (environment, country) -> seconds
+        """
+        self.__custom_logger.info(
+            'run. Parameters: %s, %s, %s, %s, %s', query_file, targets, parameters, concatenate, tag_column
+        )
+
+        results = {}
+        timings = {}
+        errors = {}
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.__max_workers, thread_name_prefix='pytoolbase-fan-out') as pool:
+            futures = {
+                pool.submit(self.__run_single, query_file, environment, country, parameters): (environment, country)
+                for environment, country in targets
+            }
+
+            for future, target in futures.items():
+                try:
+                    results[target], timings[target] = future.result()
+                except Exception as e:
+                    self.__custom_logger.critical(f'Query {query_file} failed for {target}: {e}')
+                    errors[target] = e
+
+        self.__custom_logger.info(
+            'Executed %s on %s of %s targets in %.3f seconds. Timings: %s',
+            query_file, len(results), len(targets), time.perf_counter() - start, timings
+        )
+
+        if errors and raise_on_error:
+            raise next(iter(errors.values()))
+
+        if not concatenate:
+            return results, timings
+
+        tagged = [
+            pandas_dataframe.assign(**{tag_column: country})
+            for (_, country), pandas_dataframe in results.items()
+        ]
+
+        return (pd.concat(tagged, ignore_index=True) if tagged else pd.DataFrame()), timings
+
+    def __run_single(self, query_file, environment, country, parameters):
+        host_semaphore = self.__get_host_semaphore(self.__db_class.get_database_host(environment, country))
+
+        with host_semaphore:
+            start = time.perf_counter()
+
+            with self.__db_class.connection(environment, country) as connection:
+                pandas_dataframe = self.__queries_class.get_pandas_df_from_query(
+                    query_file, connection, parameters, environment=environment, country=country
+                )
+
+            elapsed = time.perf_counter() - start
+
+        self.__custom_logger.debug(
+            '%s on %s, %s: %s rows in %.3f seconds', query_file, environment, country, len(pandas_dataframe), elapsed
+        )
+
+        return pandas_dataframe, elapsed
+
+    def __get_host_semaphore(self, host):
+        with self.__lock:
+            if host not in self.__host_semaphores:
+                self.__host_semaphores[host] = threading.BoundedSemaphore(self.__max_per_host)
+
+            return self.__host_semaphores[host]
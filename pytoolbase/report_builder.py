@@ -0,0 +1,208 @@
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+import pandas as pd
+from .my_logger import CustomLogger, configure_worker_logging, get_worker_logging_queue
+
+
+class ParallelReportBuilder:
+    """Builds many report files at the same time on a pool of processes.
+
+    openpyxl styling and saving are CPU bound and hold the GIL, so the workbooks are built
+    in separate processes. Dataframes are handed to the workers as Arrow IPC streams written
+    in shared memory instead of being pickled; query jobs are executed directly by the worker,
+    so their rows never go through the parent process.
+
+    A job is a dictionary with:
+        output_path     Path of the file to create
+        data            A pandas dataframe, or a dictionary with query_file, environment,
+                        country and parameters (optional) describing a query
+        options         Optional dictionary: format ('xlsx', 'csv' or 'parquet', default 'xlsx')
+                        and chunk_size (rows fetched at a time by query jobs, default 10000)
+
+    Attributes:
+        custom_logger   Instance of the custom logger class. Used for logging purposes
+        max_workers Number of worker processes. None uses the number of CPUs
+        paths   (env_path, secrets_path, query_path) used by the workers to run query jobs
+    """
+    __custom_logger = None
+    __max_workers = None
+    __paths = None
+
+    def __init__(self, max_workers=None, env_path=None, secrets_path=None, query_path=None):
+        self.__custom_logger = CustomLogger('ParallelReportBuilderClass').custom_logger(logging.DEBUG)
+        self.__custom_logger.info(
+            'Initializing ParallelReportBuilder Class. Parameters: %s, %s, %s, %s',
+            max_workers, env_path, secrets_path, query_path
+        )
+        self.__max_workers = max_workers
+        self.__paths = (env_path, secrets_path, query_path)
+
+    def build_reports(self, jobs):
+        """Builds every report and returns the per-job timings.
+
+        Args:
+            jobs (list):    List of job dictionaries, see the class documentation
+
+        Returns:
+            A list with a dictionary for each job: output_path, rows, transfer_seconds (time spent
+            by the parent to share the dataframe), build_seconds (time spent by the worker)
+            and seconds (wall time from submission to completion)
+
+        Raises:
+            The first error met, once every other job is over
+        """
+        self.__custom_logger.info('build_reports. %s jobs', len(jobs))
+        start = time.perf_counter()
+        shared_memories = []
+        submissions = []
+
+        try:
+            # The workers send their log records to this process, which owns the log files
+            with ProcessPoolExecutor(max_workers=self.__max_workers, initializer=configure_worker_logging,
+                                     initargs=(get_worker_logging_queue(),)) as pool:
+                for job in jobs:
+                    submitted = time.perf_counter()
+                    payload = self.__to_payload(job, shared_memories)
+                    transfer_seconds = time.perf_counter() - submitted
+                    submissions.append((job, submitted, transfer_seconds, pool.submit(_build_report, payload)))
+
+                timings = []
+                errors = []
+                for job, submitted, transfer_seconds, future in submissions:
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        self.__custom_logger.critical(f'Report {job["output_path"]} failed: {e}')
+                        errors.append(e)
+                        continue
+
+                    result['transfer_seconds'] = transfer_seconds
+                    result['seconds'] = time.perf_counter() - submitted
+                    timings.append(result)
+                    self.__custom_logger.debug('Report built: %s', result)
+        finally:
+            for shared_memory in shared_memories:
+                shared_memory.close()
+                shared_memory.unlink()
+
+        self.__custom_logger.info(
+            'Built %s of %s reports in %.3f seconds', len(timings), len(jobs), time.perf_counter() - start
+        )
+
+        if errors:
+            raise errors[0]
+
+        return timings
+
+    def __to_payload(self, job, shared_memories):
+        payload = {
+            'output_path': job['output_path'],
+            'options': job.get('options') or {},
+            'paths': self.__paths
+        }
+        data = job['data']
+
+        if not isinstance(data, pd.DataFrame):
+            payload['query'] = data
+            return payload
+
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(data, preserve_index=False)
+
+        # Measure the stream first so it can be written straight into shared memory
+        sink = pa.MockOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        size = sink.size()
+
+        shared_memory = SharedMemory(create=True, size=max(size, 1))
+        shared_memories.append(shared_memory)
+        with pa.ipc.new_stream(pa.FixedSizeBufferWriter(pa.py_buffer(shared_memory.buf)), table.schema) as writer:
+            writer.write_table(table)
+
+        payload['shared_memory'] = (shared_memory.name, size)
+
+        return payload
+
+
+def _build_report(payload):
+    """Worker side of ParallelReportBuilder: loads the data and writes the report"""
+    from .file_manipulation import CustomFile
+
+    start = time.perf_counter()
+    options = payload['options']
+    report_format = options.get('format', 'xlsx')
+    custom_file = CustomFile()
+    shared_memory = None
+
+    try:
+        if 'shared_memory' in payload:
+            shared_memory, chunks = _read_shared_dataframe(*payload['shared_memory'])
+        else:
+            chunks = _iter_query_chunks(payload['query'], payload['paths'], options.get('chunk_size', 10000))
+
+        if report_format == 'xlsx':
+            rows = custom_file.create_excel_file_from_chunks(chunks, payload['output_path'])
+        elif report_format == 'parquet':
+            rows = custom_file.create_parquet_file_from_chunks(chunks, payload['output_path'])
+        elif report_format == 'csv':
+            rows_written = []
+            custom_file.create_csv_file_from_chunks(
+                (rows_written.append(len(chunk)) or chunk for chunk in chunks), payload['output_path']
+            )
+            rows = sum(rows_written)
+        else:
+            raise ValueError(f'Unknown report format {report_format}')
+
+        chunks = None
+    finally:
+        if shared_memory is not None:
+            try:
+                shared_memory.close()
+            except BufferError:
+                # Some arrow buffers are still referenced: the memory is released with the process
+                pass
+
+    return {
+        'output_path': payload['output_path'],
+        'pid': os.getpid(),
+        'rows': rows,
+        'build_seconds': time.perf_counter() - start
+    }
+
+
+def _read_shared_dataframe(name, size):
+    import pyarrow as pa
+
+    try:
+        shared_memory = SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before python 3.13 attaching registers the block again with the resource tracker.
+        # Pool workers share the tracker of the parent, which owns and unlinks the block:
+        # the duplicate registration is harmless, unregistering it here would not be
+        shared_memory = SharedMemory(name=name)
+
+    table = pa.ipc.open_stream(pa.py_buffer(shared_memory.buf[:size])).read_all()
+
+    return shared_memory, [table.to_pandas()]
+
+
+def _iter_query_chunks(query, paths, chunk_size):
+    from .path_manipulation import PathManipulation
+    from .database_connection import Database, Queries
+
+    path_manipulation = PathManipulation(*paths)
+    database = Database(path_manipulation)
+    queries = Queries(path_manipulation)
+    connection = database.connect_to_database(query['environment'], query['country'])
+
+    try:
+        yield from queries.iter_query_chunks(
+            query['query_file'], connection, query.get('parameters'), chunk_size=chunk_size
+        )
+    finally:
+        connection.close()
@@ -2,6 +2,7 @@ from json import dumps
 from httplib2 import Http
 import logging
 from .my_logger import CustomLogger
+from .metrics import instrumented
 
 
 class GoogleWebhook:
@@ -14,6 +15,7 @@ class GoogleWebhook:
         self.__custom_logger.info(f'Initializing GoogleWebhook Class')
         self.__hook_url = hook_url
 
+    @instrumented('webhooks.send_message_to_google_space')
     def send_message_to_google_space(self, *args):
         self.__custom_logger.info('send_message_to_google_space')
         self.__create_app_message_for_webhook(*args)
@@ -36,7 +38,7 @@ class GoogleWebhook:
             body=dumps(app_message),
         )
         
-        self.__custom_logger.debug(f"response: {response}")
+        self.__custom_logger.debug("response: %s", response)
 
 
 class MicrosoftTeamsWebhook:
@@ -49,6 +51,7 @@ class MicrosoftTeamsWebhook:
         self.__custom_logger.info(f'Initializing MicrosoftTeamsWebhook Class')
         self.__hook_url = hook_url
 
+    @instrumented('webhooks.send_message_to_teams_chat')
     def send_message_to_teams_chat(self, *args):
         self.__custom_logger.info('send_message_to_teams_chat')
         self.__create_app_message_for_webhook(*args)
@@ -71,4 +74,4 @@ class MicrosoftTeamsWebhook:
             body=dumps(app_message),
         )
 
-        self.__custom_logger.debug(f"response: {response}")
\ No newline at end of file
+        self.__custom_logger.debug("response: %s", response)
\ No newline at end of file